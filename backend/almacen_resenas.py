@@ -0,0 +1,507 @@
+"""
+Almacén de reseñas en SQLite, de solo añadir: cada reseña se valora una única vez al escribirla
+y se guarda con la versión del modelo/léxico que la valoró.
+
+- La duplicidad se comprueba contra el índice único de `id` (sin cargar todos los ids en memoria).
+- Cada escritura recibe un número de `cambio` creciente (indexado): los lectores piden solo las
+  filas con cambio mayor que el último que vieron (altas nuevas o reseñas revaloradas).
+- Los agregados por listing y por listing y mes (rollups) se mantienen en la misma transacción
+  que cada alta o revaloración, sumando y restando deltas: /api/listings los lee por índice.
+- El corpus original (CSV o Parquet) se importa de forma incremental: se recuerda hasta qué byte
+  (CSV, junto con una huella de ese tramo) o fila (Parquet) se leyó y, mientras el archivo solo
+  crezca por el final, las sincronizaciones leen únicamente lo añadido (en Parquet, solo las
+  columnas necesarias).
+"""
+import contextlib
+import hashlib
+import math
+import sqlite3
+import threading
+from pathlib import Path
+
+from datos_columnares import columnas_de, es_parquet, leer_tabla, numero_filas
+from sentiment_engine import etiquetar_con_version, valorar_con_version, version_lexico, version_valoracion
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+ALMACEN_PATH = BASE_DIR / "data" / "resenas.sqlite"
+
+COLUMNAS_ENTRADA = ["listing_id", "id", "date", "reviewer_id", "reviewer_name", "comments"]
+# Parámetros por consulta IN (...) (SQLite admite 999 como mínimo)
+MAX_PARAMETROS = 900
+LOTE_REVALORAR = 5000
+# Bytes del principio y del final del tramo ya importado de un CSV que se comparan en cada sincronización
+MUESTRA_PREFIJO = 1 << 16
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS resenas (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    listing_id TEXT NOT NULL,
+    date TEXT,
+    reviewer_id TEXT,
+    reviewer_name TEXT,
+    comments TEXT NOT NULL,
+    estrellas INTEGER,
+    puntuacion_media REAL,
+    valoracion TEXT,
+    sentimiento_lexico TEXT,
+    version_valoracion TEXT,
+    version_lexico TEXT,
+    cambio INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_resenas_cambio ON resenas (cambio);
+CREATE INDEX IF NOT EXISTS idx_resenas_version ON resenas (version_valoracion);
+CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT);
+CREATE TABLE IF NOT EXISTS rollup_listing_mes (
+    listing_id TEXT NOT NULL,
+    mes TEXT NOT NULL,
+    {columnas},
+    PRIMARY KEY (listing_id, mes)
+);
+CREATE TABLE IF NOT EXISTS rollup_listing (
+    listing_id TEXT PRIMARY KEY,
+    {columnas},
+    media REAL
+);
+CREATE INDEX IF NOT EXISTS idx_rollup_listing_media ON rollup_listing (media);
+"""
+
+# Columnas acumuladas de los rollups, en el orden de los vectores de deltas
+CLASES = ("Positivo", "Neutro", "Negativo")
+COLUMNAS_ROLLUP = (
+    ["resenas", "suma_puntuacion"]
+    + [f"estrellas_{e}" for e in range(6)]
+    + [c.lower() for c in CLASES]
+)
+_ESQUEMA = _ESQUEMA.replace(
+    "{columnas}", ",\n    ".join(f"{c} {'REAL' if c == 'suma_puntuacion' else 'INTEGER'} NOT NULL DEFAULT 0" for c in COLUMNAS_ROLLUP)
+)
+_SUMAS = ", ".join(f"{c} = {c} + excluded.{c}" for c in COLUMNAS_ROLLUP)
+_UPSERT_MES = (
+    f"INSERT INTO rollup_listing_mes (listing_id, mes, {', '.join(COLUMNAS_ROLLUP)})"
+    f" VALUES (?, ?, {', '.join('?' * len(COLUMNAS_ROLLUP))})"
+    f" ON CONFLICT (listing_id, mes) DO UPDATE SET {_SUMAS}"
+)
+_UPSERT_LISTING = (
+    f"INSERT INTO rollup_listing (listing_id, {', '.join(COLUMNAS_ROLLUP)}, media)"
+    f" VALUES (?, {', '.join('?' * len(COLUMNAS_ROLLUP))}, ?)"
+    f" ON CONFLICT (listing_id) DO UPDATE SET {_SUMAS},"
+    " media = (suma_puntuacion + excluded.suma_puntuacion) / NULLIF(resenas + excluded.resenas, 0)"
+)
+# Reconstrucción completa de los rollups desde la tabla de reseñas (una vez, en bloque)
+_AGREGADOS_SQL = ", ".join(
+    ["COUNT(*)", "SUM(puntuacion_media)"]
+    + [f"SUM(estrellas = {e})" for e in range(6)]
+    + [f"SUM(valoracion = '{c}')" for c in CLASES]
+)
+VERSION_ROLLUPS = "1"
+
+CAMPOS_LECTURA = (
+    "id, listing_id, comments, reviewer_name, date, estrellas, puntuacion_media, valoracion, cambio"
+)
+
+
+class AlmacenResenas:
+    def __init__(self, path=ALMACEN_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conexion() as con:
+            con.executescript(_ESQUEMA)
+            if self._meta(con, "version_rollups") != VERSION_ROLLUPS:
+                self._reconstruir_rollups(con)
+
+    @contextlib.contextmanager
+    def _conexion(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    # --- metadatos ---------------------------------------------------------------------------
+
+    @staticmethod
+    def _meta(con, clave, defecto=None):
+        fila = con.execute("SELECT valor FROM meta WHERE clave = ?", (clave,)).fetchone()
+        return fila[0] if fila else defecto
+
+    @staticmethod
+    def _fijar_meta(con, clave, valor):
+        con.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES (?, ?)", (clave, str(valor)))
+
+    def _siguiente_cambio(self, con):
+        cambio = int(self._meta(con, "ultimo_cambio", 0)) + 1
+        self._fijar_meta(con, "ultimo_cambio", cambio)
+        return cambio
+
+    def ultimo_cambio(self):
+        with self._conexion() as con:
+            return int(self._meta(con, "ultimo_cambio", 0))
+
+    def __len__(self):
+        with self._conexion() as con:
+            return con.execute("SELECT COUNT(*) FROM resenas").fetchone()[0]
+
+    # --- rollups -----------------------------------------------------------------------------
+
+    def _reconstruir_rollups(self, con):
+        con.execute("DELETE FROM rollup_listing_mes")
+        con.execute("DELETE FROM rollup_listing")
+        con.execute(
+            f"INSERT INTO rollup_listing_mes (listing_id, mes, {', '.join(COLUMNAS_ROLLUP)})"
+            f" SELECT listing_id, substr(coalesce(date, ''), 1, 7), {_AGREGADOS_SQL}"
+            " FROM resenas GROUP BY 1, 2"
+        )
+        con.execute(
+            f"INSERT INTO rollup_listing (listing_id, {', '.join(COLUMNAS_ROLLUP)}, media)"
+            f" SELECT listing_id, {', '.join(f'SUM({c})' for c in COLUMNAS_ROLLUP)},"
+            " SUM(suma_puntuacion) / NULLIF(SUM(resenas), 0)"
+            " FROM rollup_listing_mes GROUP BY listing_id"
+        )
+        self._fijar_meta(con, "version_rollups", VERSION_ROLLUPS)
+
+    @staticmethod
+    def _aplicar_rollups(con, deltas):
+        """Suma los deltas {(listing_id, mes): vector de COLUMNAS_ROLLUP} a ambos rollups."""
+        if not deltas:
+            return
+        por_listing = {}
+        for (listing_id, _), d in deltas.items():
+            acumulado = por_listing.setdefault(listing_id, [0] * len(COLUMNAS_ROLLUP))
+            for i, valor in enumerate(d):
+                acumulado[i] += valor
+        con.executemany(_UPSERT_MES, [(l, m, *d) for (l, m), d in deltas.items()])
+        con.executemany(
+            _UPSERT_LISTING,
+            [(l, *d, d[1] / d[0] if d[0] else None) for l, d in por_listing.items()],
+        )
+
+    # --- escritura ---------------------------------------------------------------------------
+
+    def existentes(self, ids):
+        """Subconjunto de `ids` que ya están en el almacén (consulta por el índice único)."""
+        with self._conexion() as con:
+            return _existentes(con, ids)
+
+    def añadir(self, filas):
+        """
+        Añade reseñas (dicts con las columnas del CSV). Descarta las que no tienen comentario y
+        las que ya existen por `id`; solo las nuevas se valoran. Devuelve cuántas se insertaron.
+        """
+        import pandas as pd
+
+        candidatas = {}
+        for fila in filas:
+            comentario = fila.get("comments")
+            if comentario is None or pd.isna(comentario) or not str(comentario).strip():
+                continue
+            candidatas.setdefault(str(fila["id"]), fila)
+        if not candidatas:
+            return 0
+        with self._lock:
+            for rid in self.existentes(candidatas):
+                del candidatas[rid]
+            if not candidatas:
+                return 0
+            nuevas = list(candidatas.items())
+            comentarios = [str(f["comments"]) for _, f in nuevas]
+            valoraciones, etiquetas, version_v, version_l = valorar_con_version(comentarios)
+            with self._conexion() as con:
+                con.execute("BEGIN IMMEDIATE")
+                # Otro proceso pudo insertar alguno mientras se valoraba: no contarlo dos veces
+                ya = _existentes(con, [rid for rid, _ in nuevas])
+                if ya:
+                    conservar = [i for i, (rid, _) in enumerate(nuevas) if rid not in ya]
+                    nuevas = [nuevas[i] for i in conservar]
+                    comentarios = [comentarios[i] for i in conservar]
+                    valoraciones = [valoraciones[i] for i in conservar]
+                    etiquetas = [etiquetas[i] for i in conservar]
+                deltas = {}
+                for (_, f), v in zip(nuevas, valoraciones):
+                    _acumular(deltas, _texto(f.get("listing_id")), _texto(f.get("date")), v, 1)
+                self._aplicar_rollups(con, deltas)
+                cambio = self._siguiente_cambio(con)
+                con.executemany(
+                    "INSERT INTO resenas (id, listing_id, date, reviewer_id, reviewer_name,"
+                    " comments, estrellas, puntuacion_media, valoracion, sentimiento_lexico,"
+                    " version_valoracion, version_lexico, cambio)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            rid,
+                            _texto(f.get("listing_id")),
+                            _texto(f.get("date")),
+                            _texto(f.get("reviewer_id")),
+                            _texto(f.get("reviewer_name")),
+                            comentario,
+                            v["estrellas"],
+                            v["puntuacion_media"],
+                            v["valoracion"],
+                            etiqueta,
+                            version_v,
+                            version_l,
+                            cambio,
+                        )
+                        for (rid, f), comentario, v, etiqueta in zip(nuevas, comentarios, valoraciones, etiquetas)
+                    ],
+                )
+        return len(nuevas)
+
+    def sincronizar(self, path, chunksize=20000):
+        """
+        Importa del corpus (CSV o Parquet) las filas añadidas desde la última sincronización. Si el
+        archivo encogió o, en CSV, el tramo ya importado no es el mismo (se reescribió), se vuelve a
+        leer entero; las filas ya presentes se descartan por id. Devuelve cuántas reseñas nuevas se
+        insertaron.
+        """
+        path = Path(path)
+        try:
+            stat = path.stat()
+        except OSError:
+            return 0
+        clave = f"{'parquet' if es_parquet(path) else 'csv'}:{path.resolve()}"
+        with self._conexion() as con:
+            offset = int(self._meta(con, f"{clave}:offset", 0))
+            mtime = self._meta(con, f"{clave}:mtime")
+            huella = self._meta(con, f"{clave}:huella")
+        if str(stat.st_mtime_ns) == mtime:
+            return 0
+        if es_parquet(path):
+            insertadas, fin = self._importar_parquet(path, offset, chunksize)
+        else:
+            if stat.st_size < offset or _huella_prefijo(path, offset) != huella:
+                offset = 0
+            insertadas, fin = self._importar_csv(path, offset, chunksize)
+        with self._conexion() as con:
+            self._fijar_meta(con, f"{clave}:offset", fin)
+            self._fijar_meta(con, f"{clave}:mtime", stat.st_mtime_ns)
+            if not es_parquet(path):
+                self._fijar_meta(con, f"{clave}:huella", _huella_prefijo(path, fin))
+        return insertadas
+
+    def _importar_csv(self, path, offset, chunksize):
+        """Lee el CSV desde el byte `offset`. Devuelve (insertadas, byte final)."""
+        import pandas as pd
+
+        insertadas = 0
+        with open(path, "rb") as f:
+            columnas = pd.read_csv(f, nrows=0, encoding="utf-8").columns.tolist()
+            f.seek(offset)
+            opciones = {"header": None, "names": columnas} if offset else {}
+            try:
+                lector = pd.read_csv(
+                    f, dtype=str, keep_default_na=False, encoding="utf-8", chunksize=chunksize, **opciones
+                )
+                for chunk in lector:
+                    chunk = chunk.reindex(columns=COLUMNAS_ENTRADA, fill_value="")
+                    insertadas += self.añadir(chunk.to_dict("records"))
+            except pd.errors.EmptyDataError:
+                pass
+            return insertadas, f.seek(0, 2)
+
+    def _importar_parquet(self, path, offset, chunksize):
+        """Lee las filas [offset, fin) del Parquet, solo las columnas que usa el almacén."""
+        total = numero_filas(path)
+        if total < offset:
+            offset = 0
+        columnas = [c for c in COLUMNAS_ENTRADA if c in columnas_de(path)]
+        insertadas = 0
+        for inicio in range(offset, total, chunksize):
+            chunk = leer_tabla(path, columnas, inicio, inicio + chunksize)
+            chunk = chunk.reindex(columns=COLUMNAS_ENTRADA, fill_value="")
+            insertadas += self.añadir(chunk.to_dict("records"))
+        return insertadas, total
+
+    def revalorar_obsoletas(self, lote=LOTE_REVALORAR):
+        """
+        Vuelve a valorar las reseñas guardadas con otra versión de modelo o léxico. La valoración
+        se hace fuera de la transacción; dentro se releen los valores actuales y solo las filas que
+        siguen sin esa versión se actualizan y cuentan en los deltas de los rollups.
+        """
+        total = 0
+        with self._lock:
+            while True:
+                with self._conexion() as con:
+                    filas = con.execute(
+                        "SELECT seq, comments FROM resenas WHERE version_valoracion IS NOT ? LIMIT ?",
+                        (version_valoracion(), lote),
+                    ).fetchall()
+                if not filas:
+                    return total
+                valoraciones, etiquetas, version_v, version_l = valorar_con_version([c for _, c in filas])
+                nuevas = {seq: (v, e) for (seq, _), v, e in zip(filas, valoraciones, etiquetas)}
+                with self._conexion() as con:
+                    con.execute("BEGIN IMMEDIATE")
+                    # Otro proceso pudo revalorarlas mientras se valoraba: restar lo que hay ahora
+                    actuales = _pendientes(con, list(nuevas), version_v)
+                    if not actuales:
+                        continue
+                    cambio = self._siguiente_cambio(con)
+                    deltas = {}
+                    for seq, listing_id, fecha, estrellas, puntuacion, valoracion in actuales:
+                        v, e = nuevas[seq]
+                        cursor = con.execute(
+                            "UPDATE resenas SET estrellas = ?, puntuacion_media = ?, valoracion = ?,"
+                            " sentimiento_lexico = ?, version_valoracion = ?, version_lexico = ?, cambio = ?"
+                            " WHERE seq = ? AND version_valoracion IS NOT ?",
+                            (v["estrellas"], v["puntuacion_media"], v["valoracion"], e, version_v, version_l, cambio, seq, version_v),
+                        )
+                        if cursor.rowcount:
+                            anterior = {"estrellas": estrellas, "puntuacion_media": puntuacion, "valoracion": valoracion}
+                            _acumular(deltas, listing_id, fecha, anterior, -1)
+                            _acumular(deltas, listing_id, fecha, v, 1)
+                            total += 1
+                    self._aplicar_rollups(con, deltas)
+
+    def reetiquetar_obsoletas(self, lote=LOTE_REVALORAR):
+        """Actualiza solo la etiqueta de léxico (no necesita el modelo) de las filas desactualizadas."""
+        total = 0
+        with self._lock:
+            while True:
+                with self._conexion() as con:
+                    filas = con.execute(
+                        "SELECT seq, comments FROM resenas WHERE version_lexico IS NOT ? LIMIT ?",
+                        (version_lexico(), lote),
+                    ).fetchall()
+                    if not filas:
+                        return total
+                    etiquetas, version_l = etiquetar_con_version([c for _, c in filas])
+                    con.executemany(
+                        "UPDATE resenas SET sentimiento_lexico = ?, version_lexico = ? WHERE seq = ?",
+                        [(e, version_l, seq) for (seq, _), e in zip(filas, etiquetas)],
+                    )
+                total += len(filas)
+
+    # --- lectura -----------------------------------------------------------------------------
+
+    def leer_desde(self, cambio=0):
+        """Filas escritas o revaloradas después de `cambio`, en orden de alta."""
+        with self._conexion() as con:
+            cursor = con.execute(
+                f"SELECT {CAMPOS_LECTURA} FROM resenas WHERE cambio > ? ORDER BY seq", (cambio,)
+            )
+            nombres = [d[0] for d in cursor.description]
+            return [dict(zip(nombres, fila)) for fila in cursor]
+
+    def sentimiento_listing(self, listing_id):
+        """Agregados de un listing y su tendencia mensual, o None si no tiene reseñas."""
+        with self._conexion() as con:
+            fila = con.execute(
+                f"SELECT {', '.join(COLUMNAS_ROLLUP)} FROM rollup_listing WHERE listing_id = ?", (str(listing_id),)
+            ).fetchone()
+            if fila is None or not fila[0]:
+                return None
+            meses = con.execute(
+                f"SELECT mes, {', '.join(COLUMNAS_ROLLUP)} FROM rollup_listing_mes"
+                " WHERE listing_id = ? AND resenas > 0 ORDER BY mes",
+                (str(listing_id),),
+            ).fetchall()
+        resultado = {"listing_id": str(listing_id), **_resumen(fila)}
+        resultado["tendencia_mensual"] = [
+            {"mes": m[0], **{k: v for k, v in _resumen(m[1:]).items() if k != "distribucion_estrellas"}}
+            for m in meses
+        ]
+        return resultado
+
+    def ranking_listings(self, limite=50, offset=0, ascendente=False, min_resenas=1):
+        """(listings ordenados por puntuación media, total de listings con min_resenas reseñas)."""
+        orden = "ASC" if ascendente else "DESC"
+        with self._conexion() as con:
+            total = con.execute(
+                "SELECT COUNT(*) FROM rollup_listing WHERE resenas >= ?", (min_resenas,)
+            ).fetchone()[0]
+            filas = con.execute(
+                f"SELECT listing_id, {', '.join(COLUMNAS_ROLLUP)} FROM rollup_listing"
+                f" WHERE resenas >= ? ORDER BY media {orden}, listing_id LIMIT ? OFFSET ?",
+                (min_resenas, limite, offset),
+            ).fetchall()
+        return [{"listing_id": f[0], **_resumen(f[1:])} for f in filas], total
+
+    def textos_etiquetados(self):
+        """DataFrame (comments, sentimiento) para entrenar, con las etiquetas de léxico al día."""
+        import pandas as pd
+
+        self.reetiquetar_obsoletas()
+        with self._conexion() as con:
+            return pd.read_sql_query(
+                "SELECT comments, sentimiento_lexico AS sentimiento FROM resenas ORDER BY seq", con
+            )
+
+    def distribucion_etiquetas(self):
+        """Reseñas por etiqueta de léxico (la que usa el entrenamiento), con las etiquetas al día."""
+        self.reetiquetar_obsoletas()
+        with self._conexion() as con:
+            filas = con.execute(
+                "SELECT sentimiento_lexico, COUNT(*) FROM resenas GROUP BY sentimiento_lexico"
+            ).fetchall()
+        return {c: 0 for c in CLASES} | {e: n for e, n in filas if e in CLASES}
+
+
+def _huella_prefijo(path, offset):
+    """
+    Huella de los `offset` primeros bytes del archivo: su longitud, el principio y el tramo que
+    termina en `offset`. Si cambia, lo ya importado se reescribió y no basta con leer lo añadido.
+    """
+    h = hashlib.sha256(str(offset).encode())
+    with open(path, "rb") as f:
+        h.update(f.read(min(offset, MUESTRA_PREFIJO)))
+        inicio = max(offset - MUESTRA_PREFIJO, MUESTRA_PREFIJO)
+        if inicio < offset:
+            f.seek(inicio)
+            h.update(f.read(offset - inicio))
+    return h.hexdigest()[:16]
+
+
+def _existentes(con, ids):
+    ids = [str(i) for i in ids]
+    encontrados = set()
+    for i in range(0, len(ids), MAX_PARAMETROS):
+        bloque = ids[i : i + MAX_PARAMETROS]
+        marcas = ",".join("?" * len(bloque))
+        encontrados.update(r[0] for r in con.execute(f"SELECT id FROM resenas WHERE id IN ({marcas})", bloque))
+    return encontrados
+
+
+def _pendientes(con, seqs, version):
+    """Valores actuales de las filas de `seqs` que aún no tienen la versión de valoración `version`."""
+    filas = []
+    for i in range(0, len(seqs), MAX_PARAMETROS):
+        bloque = seqs[i : i + MAX_PARAMETROS]
+        marcas = ",".join("?" * len(bloque))
+        filas.extend(
+            con.execute(
+                "SELECT seq, listing_id, date, estrellas, puntuacion_media, valoracion FROM resenas"
+                f" WHERE seq IN ({marcas}) AND version_valoracion IS NOT ?",
+                (*bloque, version),
+            )
+        )
+    return filas
+
+
+def _acumular(deltas, listing_id, fecha, valoracion, signo):
+    """Suma (signo=1) o resta (signo=-1) una reseña valorada al delta de su listing y mes."""
+    d = deltas.setdefault((listing_id, (fecha or "")[:7]), [0] * len(COLUMNAS_ROLLUP))
+    d[0] += signo
+    d[1] += signo * valoracion["puntuacion_media"]
+    d[2 + valoracion["estrellas"]] += signo
+    d[8 + CLASES.index(valoracion["valoracion"])] += signo
+
+
+def _resumen(fila):
+    """Vector de COLUMNAS_ROLLUP → respuesta de la API."""
+    resenas, suma = fila[0], fila[1]
+    return {
+        "resenas": resenas,
+        "puntuacion_media": round(suma / resenas, 2) if resenas else None,
+        "distribucion_estrellas": {str(e): fila[2 + e] for e in range(6)},
+        "valoraciones": {c: fila[8 + i] for i, c in enumerate(CLASES)},
+    }
+
+
+def _texto(valor):
+    if valor is None or (isinstance(valor, float) and math.isnan(valor)):
+        return ""
+    return str(valor)
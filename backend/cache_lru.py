@@ -0,0 +1,69 @@
+"""
+Caché LRU acotada para resultados de valoración. Las claves son textos normalizados y el
+contenido pertenece a una versión de modelo + léxico: al cambiar la versión se vacía entera,
+que equivale a incluir la versión en la clave sin guardar entradas que ya no se pueden usar.
+get() y put() reciben la versión con que se valora: un resultado calculado con un modelo que ya
+no es el activo no se guarda ni se sirve, aunque la valoración empezara antes del cambio.
+"""
+import threading
+from collections import OrderedDict
+
+
+class CacheLRU:
+    def __init__(self, max_entradas=10000):
+        self.max_entradas = max_entradas
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidaciones = 0
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._datos)
+
+    def asegurar_version(self, version):
+        """Vacía la caché si los resultados guardados son de otra versión del modelo o léxico."""
+        if version == self.version:
+            return
+        with self._lock:
+            if version != self.version:
+                if self.version is not None:
+                    self.invalidaciones += 1
+                self._datos.clear()
+                self.version = version
+
+    def get(self, clave, version):
+        with self._lock:
+            valor = self._datos.get(clave) if version == self.version else None
+            if valor is None:
+                self.misses += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return valor
+
+    def put(self, clave, valor, version):
+        if self.max_entradas <= 0:
+            return
+        with self._lock:
+            if version != self.version:
+                return
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self.evictions += 1
+
+    def estado(self):
+        consultas = self.hits + self.misses
+        return {
+            "max_entradas": self.max_entradas,
+            "entradas": len(self._datos),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidaciones": self.invalidaciones,
+            "hit_rate": round(self.hits / consultas, 4) if consultas else 0.0,
+        }
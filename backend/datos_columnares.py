@@ -0,0 +1,138 @@
+"""
+Lectura del corpus de reseñas en formato columnar (Parquet) además de CSV.
+
+Un Parquet se lee solo en las columnas pedidas y, para rangos de filas, solo en los row groups
+que los contienen; las columnas de texto quedan como cadenas Arrow (pd.ArrowDtype) en lugar de
+un array de objetos Python, y se iteran tal cual hacia el vectorizador o el léxico.
+Todas las columnas se guardan como texto: los ids de reseña no caben sin pérdida en un float.
+pandas y pyarrow se importan solo al leer o convertir (importar el módulo no cuesta nada).
+
+Convertir una vez el CSV existente:
+    python scripts/convertir_a_parquet.py data/barcelona_solo_espanol.csv
+"""
+import csv
+from pathlib import Path
+
+FILAS_POR_GRUPO = 100_000
+BLOQUE_CSV = 1 << 24  # bytes por bloque al leer el CSV en streaming durante la conversión
+
+
+def _pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.csv  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Para leer o escribir Parquet hace falta pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def es_parquet(path):
+    return Path(path).suffix.lower() == ".parquet"
+
+
+def ruta_preferida(path):
+    """
+    El .parquet con el mismo nombre si existe, no es más antiguo que el CSV y pyarrow está
+    instalado; si no, la propia ruta.
+    """
+    path = Path(path)
+    if es_parquet(path):
+        return path
+    parquet = path.with_suffix(".parquet")
+    try:
+        _pyarrow()
+        if parquet.stat().st_mtime_ns >= path.stat().st_mtime_ns:
+            return parquet
+    except (ImportError, OSError):
+        pass
+    return path
+
+
+def convertir_csv(csv_path, parquet_path=None, filas_por_grupo=FILAS_POR_GRUPO):
+    """Convierte un CSV a Parquet leyéndolo en bloques (memoria acotada). Devuelve (ruta, filas)."""
+    pa = _pyarrow()
+    csv_path = Path(csv_path)
+    parquet_path = Path(parquet_path) if parquet_path else csv_path.with_suffix(".parquet")
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        columnas = next(csv.reader(f))
+    lector = pa.csv.open_csv(
+        csv_path,
+        read_options=pa.csv.ReadOptions(block_size=BLOQUE_CSV),
+        parse_options=pa.csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa.csv.ConvertOptions(column_types={c: pa.string() for c in columnas}),
+    )
+    esquema = pa.schema([(c.name, pa.string()) for c in lector.schema])
+    filas = 0
+    temporal = parquet_path.with_suffix(".parquet.tmp")
+    with pa.parquet.ParquetWriter(temporal, esquema, compression="zstd") as writer:
+        for lote in lector:
+            tabla = pa.Table.from_batches([lote]).cast(esquema)
+            writer.write_table(tabla, row_group_size=filas_por_grupo)
+            filas += tabla.num_rows
+    temporal.replace(parquet_path)
+    return parquet_path, filas
+
+
+def columnas_de(path):
+    path = Path(path)
+    if es_parquet(path):
+        return _pyarrow().parquet.ParquetFile(path).schema_arrow.names
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return next(csv.reader(f))
+
+
+def numero_filas(path):
+    path = Path(path)
+    if es_parquet(path):
+        return _pyarrow().parquet.ParquetFile(path).metadata.num_rows
+    import pandas as pd
+
+    return sum(len(b) for b in pd.read_csv(path, usecols=[0], dtype=str, chunksize=FILAS_POR_GRUPO))
+
+
+def leer_tabla(path, columnas=None, inicio=0, fin=None):
+    """
+    DataFrame con solo `columnas` (todas como texto) y las filas [inicio, fin). En Parquet solo
+    se leen los row groups que solapan el rango y el texto se queda en cadenas Arrow.
+    """
+    import pandas as pd
+
+    path = Path(path)
+    if not es_parquet(path):
+        filas = None if fin is None else fin - inicio
+        return pd.read_csv(
+            path, usecols=columnas, dtype=str, skiprows=range(1, inicio + 1) if inicio else None, nrows=filas
+        )
+    pq = _pyarrow().parquet
+    archivo = pq.ParquetFile(path)
+    meta = archivo.metadata
+    fin = meta.num_rows if fin is None else min(fin, meta.num_rows)
+    grupos, primera_fila, fila = [], None, 0
+    for g in range(meta.num_row_groups):
+        n = meta.row_group(g).num_rows
+        if fila + n > inicio and fila < fin:
+            grupos.append(g)
+            primera_fila = fila if primera_fila is None else primera_fila
+        fila += n
+    if not grupos:
+        tabla = archivo.schema_arrow.empty_table()
+        tabla = tabla.select(columnas) if columnas else tabla
+    else:
+        tabla = archivo.read_row_groups(grupos, columns=columnas)
+        tabla = tabla.slice(inicio - primera_fila, fin - inicio)
+    return tabla.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def iterar_bloques(path, columnas, tamaño=FILAS_POR_GRUPO):
+    """DataFrames de `tamaño` filas con solo `columnas`, sin cargar el archivo entero."""
+    import pandas as pd
+
+    path = Path(path)
+    if not es_parquet(path):
+        yield from pd.read_csv(path, usecols=columnas, dtype=str, chunksize=tamaño)
+        return
+    pa = _pyarrow()
+    archivo = pa.parquet.ParquetFile(path)
+    for lote in archivo.iter_batches(batch_size=tamaño, columns=columnas):
+        yield pa.Table.from_batches([lote]).to_pandas(types_mapper=pd.ArrowDtype)
@@ -0,0 +1,284 @@
+"""
+Motor de léxico compartido por train_model.py (etiquetado) y el backend (corrección por frases).
+Compila una vez la expresión de tokenización, carga diccionario y frases con el módulo csv
+(sin importar pandas, que no hace falta para arrancar la API) y expone score(texto) /
+score_many(textos) con la misma semántica en entrenamiento e inferencia.
+
+Las frases se guardan en un trie de tokens (FraseMatcher) que encuentra frases de cualquier
+longitud en una sola pasada, dando prioridad a la frase más larga.
+"""
+import csv
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+from pathlib import Path
+
+import numpy as np
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+DICCIONARIO_PATH = DATA_DIR / "diccionario_extenso.csv"
+FRASES_PATH = DATA_DIR / "frases_sentimiento.csv"
+
+# Mismos tokens que \b\w+\b (una racha máxima de \w siempre está entre límites de palabra), más rápido
+TOKEN_RE = re.compile(r"\w+")
+
+# Por debajo de este tamaño de lote no compensa la vía vectorizada
+MIN_LOTE_VECTORIZADO = 64
+CHUNK_PROCESOS = 20000
+# Token que separa los textos de un bloque al tokenizarlos juntos (ǂ no tiene mayúscula/minúscula)
+_MARCA_LOTE = "ǂǂǂ"
+_SEPARADOR_LOTE = f" {_MARCA_LOTE} "
+
+# Valores que pandas.read_csv leería como vacíos (así se descartan las mismas filas que antes)
+_VALORES_VACIOS = {"", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+                   "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"}
+# Clave de fin de frase dentro de un nodo del trie (ningún token \w+ puede ser None)
+_FIN = None
+
+
+def _filas_csv(path, *columnas):
+    """Valores de `columnas` de cada fila del CSV, saltando las que tengan alguno vacío."""
+    with open(path, encoding="utf-8", newline="") as f:
+        for fila in csv.DictReader(f):
+            valores = tuple(fila.get(c) for c in columnas)
+            if all(v is not None and v.strip() not in _VALORES_VACIOS for v in valores):
+                yield valores
+
+
+def tokenizar(texto):
+    return TOKEN_RE.findall(str(texto).lower())
+
+
+def etiqueta_de_score(score):
+    if score > 0:
+        return "Positivo"
+    if score < 0:
+        return "Negativo"
+    return "Neutro"
+
+
+class FraseMatcher:
+    """Trie de frases: cada nodo es un dict token -> nodo hijo; _FIN guarda el sentimiento."""
+
+    def __init__(self, frases=None):
+        self._raiz = {}
+        self._n_frases = 0
+        for palabras, sentimiento in (frases or {}).items():
+            self.añadir(palabras, sentimiento)
+
+    def añadir(self, palabras, sentimiento):
+        palabras = tuple(palabras)
+        if len(palabras) < 2:
+            return
+        nodo = self._raiz
+        for p in palabras:
+            nodo = nodo.setdefault(sys.intern(p), {})
+        if _FIN not in nodo:
+            self._n_frases += 1
+        nodo[_FIN] = int(sentimiento)
+
+    def __len__(self):
+        return self._n_frases
+
+    def __bool__(self):
+        return self._n_frases > 0
+
+    def palabras(self):
+        """Todas las palabras que aparecen en alguna frase."""
+        pendientes = [self._raiz]
+        vistas = set()
+        while pendientes:
+            nodo = pendientes.pop()
+            for p, hijo in nodo.items():
+                if p is not _FIN:
+                    vistas.add(p)
+                    pendientes.append(hijo)
+        return vistas
+
+    def pares_iniciales(self):
+        """Pares (primera, segunda palabra) con los que empieza alguna frase."""
+        return [(a, b) for a, nodo in self._raiz.items() for b in nodo if b is not _FIN]
+
+    def buscar(self, palabras, inicio):
+        """Frase más larga que empieza en palabras[inicio]: (fin, sentimiento) o None."""
+        nodo = self._raiz
+        mejor = None
+        for j in range(inicio, len(palabras)):
+            nodo = nodo.get(palabras[j])
+            if nodo is None:
+                break
+            if _FIN in nodo:
+                mejor = (j + 1, nodo[_FIN])
+        return mejor
+
+    def puntuar(self, palabras, lexico):
+        """
+        Suma del léxico con prioridad a las frases: se recorre el texto una vez y, en cada
+        posición, si empieza una frase se suma su sentimiento y se saltan sus palabras;
+        si no, se suma el de la palabra suelta.
+        """
+        raiz = self._raiz
+        score = 0
+        i = 0
+        n = len(palabras)
+        while i < n:
+            p = palabras[i]
+            encontrada = self.buscar(palabras, i) if p in raiz else None
+            if encontrada is not None:
+                i, sentimiento = encontrada
+                score += sentimiento
+            else:
+                score += lexico.get(p, 0)
+                i += 1
+        return score
+
+
+class Lexico:
+    """
+    Diccionario de palabras (-3 a +3) + trie de frases. Las palabras se guardan internadas
+    y con su polaridad como int de Python (los enteros pequeños son únicos en CPython).
+    """
+
+    def __init__(self, palabras=None, frases=None):
+        self.palabras = {sys.intern(p): int(v) for p, v in (palabras or {}).items()}
+        self.frases = frases if isinstance(frases, FraseMatcher) else FraseMatcher(frases)
+        self._tablas = None
+        # (n_jobs, ProcessPoolExecutor) de score_many: se reutiliza entre llamadas hasta cerrar_pool()
+        self._ejecutor = None
+
+    def __getstate__(self):
+        # A los workers se les envía el léxico sin su pool
+        estado = self.__dict__.copy()
+        estado["_ejecutor"] = None
+        return estado
+
+    @classmethod
+    def desde_csv(cls, diccionario_path=DICCIONARIO_PATH, frases_path=FRASES_PATH):
+        """Carga el diccionario (obligatorio) y las frases (opcionales si no existe el archivo)."""
+        palabras = {}
+        for palabra, sentimiento in _filas_csv(diccionario_path, "Palabra", "Sentimiento"):
+            palabras[palabra.lower().strip()] = int(float(sentimiento))
+        frases = FraseMatcher()
+        if Path(frases_path).exists():
+            for frase, sentimiento in _filas_csv(frases_path, "Frase", "Sentimiento"):
+                frases.añadir(frase.lower().strip().split(), int(float(sentimiento)))
+        return cls(palabras, frases)
+
+    def __len__(self):
+        return len(self.palabras)
+
+    def score_tokens(self, palabras):
+        return self.frases.puntuar(palabras, self.palabras)
+
+    def score(self, texto):
+        return self.score_tokens(tokenizar(texto))
+
+    def score_many(self, textos, n_jobs=1, chunksize=CHUNK_PROCESOS):
+        """
+        Puntúa muchos textos con el mismo resultado que score(). Para lotes grandes tokeniza
+        una vez, suma polaridades con una operación de arrays y solo recorre con el trie de
+        frases los textos que contienen el inicio de alguna frase. Con n_jobs != 1 reparte
+        bloques de `chunksize` textos en un pool de procesos (n_jobs=-1: todos los núcleos), que se
+        crea en la primera llamada y se reutiliza en las siguientes hasta cerrar_pool().
+        """
+        textos = list(textos)
+        if n_jobs == -1:
+            n_jobs = os.cpu_count() or 1
+        if n_jobs > 1 and len(textos) > chunksize:
+            bloques = [textos[i : i + chunksize] for i in range(0, len(textos), chunksize)]
+            return np.concatenate(list(self._pool(n_jobs).map(_score_bloque_worker, bloques)))
+        return self._score_bloque(textos)
+
+    def _pool(self, n_jobs):
+        if self._ejecutor is None or self._ejecutor[0] != n_jobs:
+            self.cerrar_pool()
+            ejecutor = ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(self,))
+            self._ejecutor = (n_jobs, ejecutor)
+        return self._ejecutor[1]
+
+    def cerrar_pool(self):
+        """Termina los procesos de score_many(n_jobs != 1), si los hay."""
+        if self._ejecutor is not None:
+            self._ejecutor[1].shutdown()
+            self._ejecutor = None
+
+    def _tablas_lote(self):
+        """
+        Tablas de la vía vectorizada: token -> código (0 = desconocida, 1 = separador de textos),
+        polaridad por código y los pares de códigos (1ª, 2ª palabra) con los que empieza alguna frase.
+        """
+        if self._tablas is None:
+            vocab = list(dict.fromkeys(chain(self.palabras, self.frases.palabras())))
+            codigos = {p: i for i, p in enumerate(vocab, start=2)}
+            codigos[_MARCA_LOTE] = 1
+            n_codigos = len(vocab) + 2
+            polaridades = np.zeros(n_codigos, dtype=np.int64)
+            for p, v in self.palabras.items():
+                polaridades[codigos[p]] = v
+            pares = np.array(
+                sorted(codigos[a] * n_codigos + codigos[b] for a, b in self.frases.pares_iniciales()),
+                dtype=np.int64,
+            )
+            self._tablas = (codigos, polaridades, n_codigos, pares)
+        return self._tablas
+
+    def _score_bloque(self, textos):
+        textos = [str(t) for t in textos]
+        if len(textos) < MIN_LOTE_VECTORIZADO:
+            return np.array([self.score(t) for t in textos], dtype=np.int64)
+        bloque = _SEPARADOR_LOTE.join(textos).lower()
+        if bloque.count(_MARCA_LOTE) != len(textos) - 1:
+            # Algún texto contiene la marca de separación: se puntúa texto a texto
+            return np.array([self.score(t) for t in textos], dtype=np.int64)
+        codigos, polaridades, n_codigos, pares_frase = self._tablas_lote()
+
+        # Una sola tokenización para todo el bloque y polaridades sumadas por documento
+        tokens = TOKEN_RE.findall(bloque)
+        cods = np.fromiter(map(codigos.get, tokens, repeat(0)), dtype=np.int64, count=len(tokens))
+        doc_ids = np.cumsum(cods == 1)
+        pesos = polaridades[cods]
+        scores = np.bincount(doc_ids, weights=pesos, minlength=len(textos)).astype(np.int64)
+
+        # Frases: solo se recorre el trie donde las dos primeras palabras ya coinciden con el
+        # comienzo de alguna frase (filtro vectorizado); en orden y sin solapes, se suma su
+        # sentimiento y se descuentan las palabras sueltas que la forman.
+        candidatas = np.flatnonzero(np.isin(cods[:-1] * n_codigos + cods[1:], pares_frase))
+        buscar = self.frases.buscar
+        inicios, fines, sentimientos = [], [], []
+        fin_anterior = 0
+        for pos in candidatas.tolist():
+            if pos < fin_anterior:
+                continue
+            encontrada = buscar(tokens, pos)
+            if encontrada is not None:
+                fin_anterior, sentimiento = encontrada
+                inicios.append(pos)
+                fines.append(fin_anterior)
+                sentimientos.append(sentimiento)
+        if inicios:
+            acumulado = np.concatenate(([0], np.cumsum(pesos)))
+            inicios = np.array(inicios)
+            palabras_frase = acumulado[np.array(fines)] - acumulado[inicios]
+            np.add.at(scores, doc_ids[inicios], np.array(sentimientos) - palabras_frase)
+        return scores
+
+    def etiquetar(self, texto):
+        return etiqueta_de_score(self.score(texto))
+
+    def etiquetar_many(self, textos, n_jobs=1, chunksize=CHUNK_PROCESOS):
+        scores = self.score_many(textos, n_jobs=n_jobs, chunksize=chunksize)
+        return np.select([scores > 0, scores < 0], ["Positivo", "Negativo"], default="Neutro")
+
+
+_lexico_worker = None
+
+
+def _init_worker(lexico):
+    global _lexico_worker
+    _lexico_worker = lexico
+
+
+def _score_bloque_worker(textos):
+    return _lexico_worker._score_bloque(textos)
@@ -1,16 +1,87 @@
 """
 API FastAPI para el modelo de sentimiento de reseñas Airbnb.
 Arrancar: uvicorn main:app --reload --port 8000
+
+Importar este módulo no carga pandas, joblib ni scikit-learn (solo los usan la importación del
+corpus y un modelo sin artefacto compacto). El modelo se precalienta en segundo plano al arrancar
+(SENTIMENT_PRECALENTAR=0 lo deja para la primera valoración).
 """
+import asyncio
+import os
+import secrets
+import threading
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
-import pandas as pd
-from fastapi import FastAPI, HTTPException
+from typing import Optional
+
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
-from sentiment_engine import valorar_reseña, get_pipeline
+from sentiment_engine import (
+    cache_resultados,
+    cerrar_pool,
+    comprobar_cambios,
+    estado_modelo,
+    estado_pool,
+    iniciar_pool,
+    modelo_cargado,
+    modelo_disponible,
+    precalentar,
+    recargar,
+    valorar_reseñas,
+)
+from almacen_resenas import AlmacenResenas
+from resenas_store import ResenasStore, VALORACIONES
+from microbatch import MicroBatcher
+from valoracion_stream import MAX_BLOQUE, TAMAÑO_BLOQUE, formato_de, valorar_stream
+from metricas import MiddlewareMetricas, instrumentar_handler, peticiones_lentas, perfilador, registro
+
+# Las peticiones concurrentes a /api/valorar se agrupan en un solo predict_proba
+# (límites configurables con SENTIMENT_MICROBATCH_MAX_LOTE y SENTIMENT_MICROBATCH_MAX_ESPERA_MS)
+microbatcher = MicroBatcher.desde_entorno(valorar_reseñas)
+PRECALENTAR = os.environ.get("SENTIMENT_PRECALENTAR", "1") != "0"
+# Se activa cuando termina bien el precalentamiento (o al arrancar, si no se precalienta)
+precalentado = threading.Event()
+# Espera inicial y máxima (s) entre reintentos si el precalentamiento falla
+ESPERA_PRECALENTAR = 1.0
+MAX_ESPERA_PRECALENTAR = 30.0
+
+
+async def _precalentar_con_reintentos():
+    # Si falla (p. ej. archivo a medio escribir), el error queda en /api/health (modelo.ultimo_error)
+    # y se reintenta con espera creciente: en cuanto un modelo carga y valora, la API queda lista
+    espera = ESPERA_PRECALENTAR
+    while not await asyncio.to_thread(precalentar):
+        await asyncio.sleep(espera)
+        espera = min(espera * 2, MAX_ESPERA_PRECALENTAR)
+    precalentado.set()
+
 
-app = FastAPI(title="Airbnb Sentiment API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app):
+    # Con SENTIMENT_PROCESOS > 1 los lotes grandes (importación del corpus, /api/valorar/lote,
+    # streaming) se reparten entre procesos que comparten el modelo cargado aquí
+    iniciar_pool()
+    # El precalentamiento no retrasa el arranque: hasta que termina, /api/health da listo=false
+    precalentado.clear()
+    precalentamiento = None
+    if PRECALENTAR:
+        precalentamiento = asyncio.create_task(_precalentar_con_reintentos())
+    else:
+        precalentado.set()
+    microbatcher.iniciar()
+    yield
+    await microbatcher.detener()
+    if precalentamiento is not None:
+        precalentamiento.cancel()
+        with suppress(asyncio.CancelledError):
+            await precalentamiento
+    cerrar_pool()
+
+
+app = FastAPI(title="Airbnb Sentiment API", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,9 +90,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Conteo y latencia por ruta para /api/metrics (se desactiva con SENTIMENT_METRICAS=0)
+app.add_middleware(MiddlewareMetricas)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-DATA_PATH = BASE_DIR / "data" / "barcelona_solo_espanol.csv"
+# Corpus y almacén SQLite configurables (p. ej. los benchmarks usan unos temporales)
+DATA_PATH = Path(os.environ.get("SENTIMENT_DATOS", BASE_DIR / "data" / "barcelona_solo_espanol.csv"))
+ALMACEN_PATH = os.environ.get("SENTIMENT_ALMACEN")
+MAX_LOTE = 5000
+# POST /api/admin/reload exige la cabecera X-Admin-Token con este valor; sin él, la ruta responde 403
+ADMIN_TOKEN = os.environ.get("SENTIMENT_ADMIN_TOKEN")
+
+resenas_store = ResenasStore(DATA_PATH, AlmacenResenas(ALMACEN_PATH) if ALMACEN_PATH else None)
 
 
 class ValorarRequest(BaseModel):
@@ -35,43 +115,202 @@ class ValorarResponse(BaseModel):
     estrellas_emoji: str
 
 
+class ValorarLoteRequest(BaseModel):
+    textos: list[str]
+
+
+class ValorarLoteResponse(BaseModel):
+    resultados: list[ValorarResponse]
+    total: int
+
+
+def _listo():
+    """Preparada para valorar: precalentamiento terminado, o carga diferida a la primera petición."""
+    return precalentado.is_set()
+
+
 @app.get("/api/health")
+@instrumentar_handler
 def health():
-    """Comprueba si la API y el modelo están listos."""
-    pipeline = get_pipeline()
-    return {"ok": True, "modelo_cargado": pipeline is not None}
+    """
+    Estado de la API sin esperar al modelo: `vivo` si responde (liveness), `listo` cuando el
+    modelo está cargado y precalentado (readiness), y qué versión de modelo y léxico se usa.
+    """
+    if modelo_cargado():
+        comprobar_cambios()
+    return {
+        "ok": True,
+        "vivo": True,
+        "listo": _listo(),
+        "modelo_cargado": modelo_disponible(),
+        "modelo": estado_modelo(),
+        "microbatch": microbatcher.estado(),
+        "cache": cache_resultados.estado(),
+        "pool": estado_pool(),
+    }
+
+
+@app.get("/api/health/ready")
+def health_ready():
+    """Readiness para balanceadores y orquestadores: 200 si está lista, 503 mientras precalienta."""
+    listo = _listo()
+    return JSONResponse({"listo": listo}, status_code=200 if listo else 503)
+
+
+@app.get("/api/health/live")
+def health_live():
+    """Liveness: responde mientras el proceso atiende peticiones."""
+    return {"vivo": True}
+
+
+@app.post("/api/admin/reload", status_code=202)
+def recargar_modelo(
+    esperar: bool = False,
+    forzar: bool = False,
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    Vuelve a cargar modelo y léxico de disco en segundo plano; hasta que terminan se sigue valorando
+    con los actuales. Si los archivos no cambiaron no hace nada, salvo con ?forzar=true. Con
+    ?esperar=true responde cuando la nueva versión ya está activa.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Recarga desactivada: define SENTIMENT_ADMIN_TOKEN")
+    if not secrets.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Token de administración no válido")
+    estado = recargar(esperar=esperar, forzar=forzar)
+    if esperar and estado["ultimo_error"]:
+        raise HTTPException(status_code=500, detail=f"No se pudo recargar: {estado['ultimo_error']}")
+    return estado
 
 
 @app.post("/api/valorar", response_model=ValorarResponse)
-def valorar(body: ValorarRequest):
-    """Valora una reseña y devuelve estrellas (0-5), puntuación media y etiqueta."""
+@instrumentar_handler
+async def valorar(body: ValorarRequest):
+    """
+    Valora una reseña y devuelve estrellas (0-5), puntuación media y etiqueta.
+    Se resuelve a través del micro-batcher junto con las demás peticiones concurrentes.
+    """
     if not (body.texto or "").strip():
         raise HTTPException(status_code=400, detail="El texto no puede estar vacío")
-    return valorar_reseña(body.texto)
+    return await microbatcher.enviar(body.texto)
+
+
+@app.post("/api/valorar/lote", response_model=ValorarLoteResponse)
+@instrumentar_handler
+def valorar_lote(body: ValorarLoteRequest):
+    """Valora varias reseñas en una sola llamada al modelo. Mismo resultado por texto que /api/valorar."""
+    if not body.textos:
+        raise HTTPException(status_code=400, detail="La lista de textos no puede estar vacía")
+    if len(body.textos) > MAX_LOTE:
+        raise HTTPException(status_code=413, detail=f"Máximo {MAX_LOTE} textos por lote")
+    vacios = [i for i, t in enumerate(body.textos) if not (t or "").strip()]
+    if vacios:
+        raise HTTPException(status_code=400, detail=f"Textos vacíos en las posiciones {vacios[:10]}")
+    resultados = valorar_reseñas(body.textos)
+    return {"resultados": resultados, "total": len(resultados)}
+
+
+class StreamingDuplexResponse(StreamingResponse):
+    """
+    StreamingResponse que se genera mientras aún se lee el cuerpo de la petición. La original
+    (ASGI < 2.4) escucha desconexiones con receive() en paralelo y se quedaría con los mensajes
+    del cuerpo; aquí la desconexión la detecta request.stream() al leer.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@app.post("/api/valorar/stream")
+async def valorar_stream_endpoint(
+    request: Request,
+    formato: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    columna: Optional[str] = None,
+    bloque: int = Query(TAMAÑO_BLOQUE, ge=1, le=MAX_BLOQUE),
+):
+    """
+    Valora un archivo NDJSON o CSV enviado como cuerpo de la petición y devuelve el mismo formato
+    con la valoración añadida a cada registro, en streaming: se valora por bloques de `bloque`
+    registros y cada bloque se envía en cuanto está listo, con memoria constante.
+    El formato se toma de ?formato= o del Content-Type (text/csv, application/x-ndjson).
+    """
+    formato = formato or formato_de(request.headers.get("content-type"))
+    tipo = "text/csv; charset=utf-8" if formato == "csv" else "application/x-ndjson"
+    return StreamingDuplexResponse(valorar_stream(request.stream(), formato, columna, bloque), media_type=tipo)
 
 
 @app.get("/api/resenas")
-def listar_resenas(limite: int = 200):
+@instrumentar_handler
+def listar_resenas(
+    limite: int = Query(200, ge=1),
+    offset: int = Query(0, ge=0),
+    valoracion: Optional[str] = None,
+    listing_id: Optional[str] = None,
+):
     """
-    Devuelve reseñas del CSV de Barcelona con su valoración.
-    Opcional: ?limite=100 para limitar resultados (por rendimiento).
+    Devuelve reseñas de Barcelona con su valoración, calculada una vez al guardarlas en el almacén
+    SQLite (el CSV se importa de forma incremental).
+    Paginación con ?offset=0&limite=200 y filtros opcionales ?valoracion=Negativo&listing_id=18674.
+    'total' es el número de reseñas que cumplen los filtros (no solo las de la página).
     """
-    if not DATA_PATH.exists():
+    if valoracion is not None and valoracion not in VALORACIONES:
+        raise HTTPException(status_code=400, detail=f"valoracion debe ser una de {list(VALORACIONES)}")
+    rows, total = resenas_store.consultar(
+        offset=offset, limite=limite, valoracion=valoracion, listing_id=listing_id
+    )
+    if total == 0 and not DATA_PATH.exists() and len(resenas_store.almacen) == 0:
         raise HTTPException(status_code=404, detail="No se encontró el archivo de datos")
-    df = pd.read_csv(DATA_PATH)
-    df = df.dropna(subset=["comments"])
-    df = df.head(limite)
-    rows = []
-    for _, r in df.iterrows():
-        v = valorar_reseña(str(r.get("comments", "")))
-        rows.append({
-            "id": str(r.get("id", "")),
-            "comments": str(r.get("comments", "")),
-            "reviewer_name": str(r.get("reviewer_name", "")),
-            "date": str(r.get("date", "")),
-            "estrellas": v["estrellas"],
-            "puntuacion_media": v["puntuacion_media"],
-            "valoracion": v["valoracion"],
-            "estrellas_emoji": v["estrellas_emoji"],
-        })
-    return {"resenas": rows, "total": len(rows)}
+    return {"resenas": rows, "total": total, "offset": offset, "limite": limite}
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def metricas():
+    """
+    Métricas en formato de texto de Prometheus: peticiones y latencia por ruta, tiempo por etapa
+    (cache, lexico, tfidf, predict_proba, postproceso, pool, handler, serializacion), tamaños de
+    lote, tiempo de carga del modelo y estado de la caché, del micro-batcher y del pool de procesos.
+    """
+    extra = [(f"sentiment_cache_{k}", v) for k, v in cache_resultados.estado().items()]
+    extra += [(f"sentiment_microbatch_{k}", v) for k, v in microbatcher.estado().items()]
+    extra += [(f"sentiment_pool_{k}", v) for k, v in estado_pool().items() if isinstance(v, (int, float))]
+    return registro.exponer(extra)
+
+
+@app.get("/api/metrics/lentas")
+def metricas_lentas():
+    """Peticiones más lentas vistas y perfiles cProfile muestreados (SENTIMENT_PERFIL_MUESTREO)."""
+    return {"peticiones": peticiones_lentas.listar(), "perfiles": perfilador.listar()}
+
+
+@app.get("/api/listings/ranking")
+@instrumentar_handler
+def ranking_listings(
+    limite: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    orden: str = Query("desc", pattern="^(asc|desc)$"),
+    min_resenas: int = Query(1, ge=1),
+):
+    """
+    Listings ordenados por puntuación media (?orden=desc mejores primero, asc peores primero),
+    con sus distribuciones de estrellas y valoraciones. Se sirve de los rollups del almacén.
+    """
+    listings, total = resenas_store.almacen_al_dia().ranking_listings(
+        limite=limite, offset=offset, ascendente=orden == "asc", min_resenas=min_resenas
+    )
+    return {"listings": listings, "total": total, "offset": offset, "limite": limite}
+
+
+@app.get("/api/listings/{listing_id}/sentimiento")
+@instrumentar_handler
+def sentimiento_listing(listing_id: str):
+    """
+    Sentimiento agregado de un listing: puntuación media, distribución de estrellas, número de
+    reseñas por valoración y tendencia mensual. Se mantiene al escribir cada reseña (sin revalorar).
+    """
+    resultado = resenas_store.almacen_al_dia().sentimiento_listing(listing_id)
+    if resultado is None:
+        raise HTTPException(status_code=404, detail=f"El listing {listing_id} no tiene reseñas")
+    return resultado
@@ -0,0 +1,302 @@
+"""
+Instrumentación del camino caliente y exposición de métricas en formato de texto de Prometheus.
+
+- medir(etapa): context manager que acumula el tiempo de una etapa (tfidf, predict_proba, lexico...)
+  en un histograma. Con SENTIMENT_METRICAS=0 no mide nada (devuelve un contexto vacío compartido).
+- MiddlewareMetricas: middleware ASGI que cuenta peticiones y mide su latencia por ruta, separa
+  el tiempo del handler del de serialización/framework y guarda las peticiones más lentas.
+- PerfiladorMuestreo: con SENTIMENT_PERFIL_MUESTREO > 0 perfila con cProfile una fracción de las
+  valoraciones y conserva los perfiles más lentos (y los vuelca a SENTIMENT_PERFIL_DIR si existe).
+"""
+import contextvars
+import cProfile
+import functools
+import heapq
+import inspect
+import io
+import itertools
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+ACTIVAS = os.environ.get("SENTIMENT_METRICAS", "1") != "0"
+
+BUCKETS_SEGUNDOS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+BUCKETS_TAMAÑO = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+_NULO = nullcontext()
+# Tiempos de la petición en curso; lo crea el middleware y lo rellena el handler
+_peticion_actual = contextvars.ContextVar("peticion_actual", default=None)
+
+
+class Histograma:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.conteos = [0] * (len(buckets) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        i = 0
+        for limite in self.buckets:
+            if valor <= limite:
+                break
+            i += 1
+        self.conteos[i] += 1
+        self.suma += valor
+        self.total += 1
+
+
+class Registro:
+    """Contadores e histogramas con etiquetas: {(nombre, etiquetas ordenadas): valor}."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self._histogramas = {}
+        self._gauges = {}
+        self._ayuda = {}
+
+    def describir(self, nombre, ayuda):
+        self._ayuda[nombre] = ayuda
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, buckets=BUCKETS_SEGUNDOS, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = self._histogramas[clave] = Histograma(buckets)
+            histograma.observar(valor)
+
+    def fijar(self, nombre, valor, **etiquetas):
+        with self._lock:
+            self._gauges[(nombre, tuple(sorted(etiquetas.items())))] = valor
+
+    def _tras_fork(self):
+        # Un proceso creado con fork mientras otro hilo tenía el lock lo heredaría cerrado
+        self._lock = threading.Lock()
+
+    def exponer(self, gauges_extra=()):
+        """Texto en formato de exposición de Prometheus (versión 0.0.4)."""
+        lineas = []
+        with self._lock:
+            contadores = sorted(self._contadores.items())
+            histogramas = sorted(self._histogramas.items(), key=lambda kv: kv[0])
+            gauges = sorted(list(self._gauges.items()) + [((n, ()), v) for n, v in gauges_extra])
+
+        def cabecera(nombre, tipo, vistos):
+            if nombre not in vistos:
+                vistos.add(nombre)
+                if nombre in self._ayuda:
+                    lineas.append(f"# HELP {nombre} {self._ayuda[nombre]}")
+                lineas.append(f"# TYPE {nombre} {tipo}")
+
+        vistos = set()
+        for (nombre, etiquetas), valor in contadores:
+            cabecera(nombre, "counter", vistos)
+            lineas.append(f"{nombre}{_etiquetas(etiquetas)} {valor}")
+        for (nombre, etiquetas), valor in gauges:
+            cabecera(nombre, "gauge", vistos)
+            lineas.append(f"{nombre}{_etiquetas(etiquetas)} {valor}")
+        for (nombre, etiquetas), h in histogramas:
+            cabecera(nombre, "histogram", vistos)
+            acumulado = 0
+            for limite, conteo in zip(list(h.buckets) + ["+Inf"], h.conteos):
+                acumulado += conteo
+                lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', str(limite)),))} {acumulado}")
+            lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {h.suma}")
+            lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {h.total}")
+        return "\n".join(lineas) + "\n"
+
+
+def _etiquetas(pares):
+    if not pares:
+        return ""
+    texto = ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pares)
+    return "{" + texto + "}"
+
+
+registro = Registro()
+registro.describir("sentiment_peticiones_total", "Peticiones HTTP atendidas por ruta, método y código de estado.")
+registro.describir("sentiment_peticion_segundos", "Latencia total de las peticiones HTTP por ruta.")
+registro.describir("sentiment_etapa_segundos", "Tiempo por etapa del camino caliente de valoración.")
+registro.describir("sentiment_lote_tamano", "Textos por llamada a valorar_reseñas.")
+registro.describir("sentiment_microbatch_tamano", "Peticiones agrupadas en cada lote del micro-batcher.")
+registro.describir("sentiment_modelo_carga_segundos", "Tiempo de la última carga del modelo.")
+registro.describir("sentiment_modelo_recargas_total", "Recargas en caliente del modelo o el léxico.")
+registro.describir("sentiment_modelo_recargas_fallidas_total", "Recargas descartadas por error al leer los archivos.")
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=registro._tras_fork)
+
+
+def medir(etapa):
+    """Mide la etapa en el histograma sentiment_etapa_segundos (sin coste si las métricas están apagadas)."""
+    if not ACTIVAS:
+        return _NULO
+    return _medir(etapa)
+
+
+@contextmanager
+def _medir(etapa):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registro.observar("sentiment_etapa_segundos", time.perf_counter() - inicio, etapa=etapa)
+
+
+def observar_tamaño(nombre, tamaño):
+    if ACTIVAS:
+        registro.observar(nombre, tamaño, buckets=BUCKETS_TAMAÑO)
+
+
+def instrumentar_handler(funcion):
+    """Decorador de handlers: anota su duración en la petición para separarla de la serialización."""
+    if inspect.iscoroutinefunction(funcion):
+        @functools.wraps(funcion)
+        async def envoltorio(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return await funcion(*args, **kwargs)
+            finally:
+                _anotar_handler(time.perf_counter() - inicio)
+    else:
+        @functools.wraps(funcion)
+        def envoltorio(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                _anotar_handler(time.perf_counter() - inicio)
+    return envoltorio
+
+
+def _anotar_handler(segundos):
+    tiempos = _peticion_actual.get()
+    if tiempos is not None:
+        tiempos["handler"] = segundos
+
+
+class PeticionesLentas:
+    """Las N peticiones más lentas vistas (ruta, total, handler, serialización)."""
+
+    def __init__(self, maximo=20):
+        self.maximo = maximo
+        self._heap = []
+        self._contador = itertools.count()
+        self._lock = threading.Lock()
+
+    def registrar(self, segundos, datos):
+        with self._lock:
+            entrada = (segundos, next(self._contador), datos)
+            if len(self._heap) < self.maximo:
+                heapq.heappush(self._heap, entrada)
+            elif segundos > self._heap[0][0]:
+                heapq.heapreplace(self._heap, entrada)
+
+    def listar(self):
+        with self._lock:
+            return [datos for _, _, datos in sorted(self._heap, reverse=True)]
+
+
+peticiones_lentas = PeticionesLentas()
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI (sin BaseHTTPMiddleware, para no añadir una tarea por petición)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ACTIVAS:
+            await self.app(scope, receive, send)
+            return
+        tiempos = {}
+        token = _peticion_actual.set(tiempos)
+        estado = {"codigo": 500}
+
+        async def send_con_estado(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["codigo"] = mensaje["status"]
+            await send(mensaje)
+
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_con_estado)
+        finally:
+            total = time.perf_counter() - inicio
+            _peticion_actual.reset(token)
+            ruta = getattr(scope.get("route"), "path", "sin_ruta")
+            registro.incrementar(
+                "sentiment_peticiones_total", ruta=ruta, metodo=scope["method"], estado=estado["codigo"]
+            )
+            registro.observar("sentiment_peticion_segundos", total, ruta=ruta)
+            datos = {"ruta": ruta, "metodo": scope["method"], "estado": estado["codigo"], "total_ms": round(total * 1000, 3)}
+            if "handler" in tiempos:
+                registro.observar("sentiment_etapa_segundos", tiempos["handler"], etapa="handler")
+                serializacion = max(0.0, total - tiempos["handler"])
+                registro.observar("sentiment_etapa_segundos", serializacion, etapa="serializacion")
+                datos["handler_ms"] = round(tiempos["handler"] * 1000, 3)
+                datos["serializacion_ms"] = round(serializacion * 1000, 3)
+            peticiones_lentas.registrar(total, datos)
+
+
+class PerfiladorMuestreo:
+    """
+    Perfila con cProfile una fracción `muestreo` de las llamadas y guarda las más lentas. Solo se
+    perfila una llamada a la vez (desde Python 3.12 dos perfiladores simultáneos dan ValueError):
+    si ya hay una en curso, la muestra se salta.
+    """
+
+    def __init__(self, muestreo=0.0, maximo=10, directorio=None):
+        self.muestreo = muestreo
+        self.directorio = Path(directorio) if directorio else None
+        self._lentas = PeticionesLentas(maximo)
+        self._rng = random.Random()
+        self._perfilando = threading.Lock()
+
+    @classmethod
+    def desde_entorno(cls):
+        return cls(
+            muestreo=float(os.environ.get("SENTIMENT_PERFIL_MUESTREO", 0.0)),
+            directorio=os.environ.get("SENTIMENT_PERFIL_DIR") or None,
+        )
+
+    def llamar(self, nombre, funcion, *args):
+        if self.muestreo <= 0 or self._rng.random() >= self.muestreo:
+            return funcion(*args)
+        if not self._perfilando.acquire(blocking=False):
+            return funcion(*args)
+        try:
+            perfil = cProfile.Profile()
+            inicio = time.perf_counter()
+            resultado = perfil.runcall(funcion, *args)
+            segundos = time.perf_counter() - inicio
+        finally:
+            self._perfilando.release()
+        salida = io.StringIO()
+        pstats.Stats(perfil, stream=salida).sort_stats("cumulative").print_stats(20)
+        datos = {"nombre": nombre, "ms": round(segundos * 1000, 3), "perfil": salida.getvalue()}
+        if self.directorio is not None:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            archivo = self.directorio / f"{nombre}_{int(time.time() * 1000)}_{segundos * 1000:.1f}ms.prof"
+            perfil.dump_stats(archivo)
+            datos["archivo"] = str(archivo)
+        self._lentas.registrar(segundos, datos)
+        return resultado
+
+    def listar(self):
+        return self._lentas.listar()
+
+
+perfilador = PerfiladorMuestreo.desde_entorno()
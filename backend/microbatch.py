@@ -0,0 +1,98 @@
+"""
+Micro-batching para la API: las peticiones concurrentes de /api/valorar se encolan y se valoran
+juntas en un único lote vectorizado cuando se llena el lote (max_lote) o pasa el tiempo máximo
+de espera (max_espera_ms) desde la primera petición del lote. Cada petición recibe su resultado.
+"""
+import asyncio
+import os
+
+from metricas import observar_tamaño
+
+
+class MicroBatcher:
+    def __init__(self, funcion_lote, max_lote=64, max_espera_ms=2.0):
+        """funcion_lote(lista de items) -> lista de resultados en el mismo orden (se ejecuta en un hilo)."""
+        self.funcion_lote = funcion_lote
+        self.max_lote = max_lote
+        self.max_espera_ms = max_espera_ms
+        self.lotes = 0
+        self.items = 0
+        self.mayor_lote = 0
+        self._cola = None
+        self._tarea = None
+
+    @classmethod
+    def desde_entorno(cls, funcion_lote):
+        return cls(
+            funcion_lote,
+            max_lote=int(os.environ.get("SENTIMENT_MICROBATCH_MAX_LOTE", 64)),
+            max_espera_ms=float(os.environ.get("SENTIMENT_MICROBATCH_MAX_ESPERA_MS", 2.0)),
+        )
+
+    def iniciar(self):
+        if self._tarea is None or self._tarea.done():
+            self._cola = asyncio.Queue()
+            self._tarea = asyncio.get_running_loop().create_task(self._procesar())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+    async def enviar(self, item):
+        """Encola un item y espera su resultado."""
+        self.iniciar()
+        futuro = asyncio.get_running_loop().create_future()
+        await self._cola.put((item, futuro))
+        return await futuro
+
+    async def _recoger_lote(self):
+        loop = asyncio.get_running_loop()
+        lote = [await self._cola.get()]
+        limite = loop.time() + self.max_espera_ms / 1000
+        while len(lote) < self.max_lote:
+            if not self._cola.empty():
+                lote.append(self._cola.get_nowait())
+                continue
+            restante = limite - loop.time()
+            if restante <= 0:
+                break
+            try:
+                lote.append(await asyncio.wait_for(self._cola.get(), restante))
+            except asyncio.TimeoutError:
+                break
+        return lote
+
+    async def _procesar(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = await self._recoger_lote()
+            items = [item for item, _ in lote]
+            try:
+                resultados = await loop.run_in_executor(None, self.funcion_lote, items)
+            except Exception as e:
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+            self.lotes += 1
+            self.items += len(lote)
+            self.mayor_lote = max(self.mayor_lote, len(lote))
+            observar_tamaño("sentiment_microbatch_tamano", len(lote))
+            for (_, futuro), resultado in zip(lote, resultados):
+                if not futuro.done():
+                    futuro.set_result(resultado)
+
+    def estado(self):
+        return {
+            "max_lote": self.max_lote,
+            "max_espera_ms": self.max_espera_ms,
+            "lotes": self.lotes,
+            "items": self.items,
+            "lote_medio": round(self.items / self.lotes, 2) if self.lotes else 0.0,
+            "mayor_lote": self.mayor_lote,
+        }
@@ -0,0 +1,383 @@
+"""
+Formato compacto del modelo para inferencia: vocabulario, IDF y coeficientes como arrays .npy
+que se abren con memory-map, de modo que varios workers comparten las mismas páginas y el
+arranque no necesita scikit-learn ni deserializar el pipeline.
+
+Se genera desde el pipeline TF-IDF + clasificador lineal que guarda train_model.py:
+    python backend/modelo_compacto.py              # exporta model/sentiment_pipeline.joblib
+    python backend/modelo_compacto.py --verificar  # compara con pipeline.predict_proba()
+
+Si solo hay joblib, PredictorCompacto.desde_pipeline() construye el mismo predictor en memoria.
+comprimir() poda las columnas de peso casi nulo y redondea los coeficientes a float16 o int8
+(train_model.py --podar/--cuantizar); el artefacto guarda entonces los coeficientes en ese tipo.
+Los términos se buscan en un diccionario término → columna (nunca en arrays de cadenas de ancho
+fijo, cuyo tamaño por elemento lo marcaría el término más largo del lote); para pocos textos (una
+reseña por petición) las frecuencias se cuentan con Counter y, para lotes, con np.unique.
+"""
+import copy
+import hashlib
+import json
+import re
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODEL_PATH = BASE_DIR / "model" / "sentiment_pipeline.joblib"
+COMPACTO_DIR = BASE_DIR / "model" / "sentiment_compacto"
+
+FORMATO_VERSION = 2
+# La versión 1 es la misma sin coeficientes cuantizados
+FORMATOS_LEGIBLES = (1, 2)
+CUANTIZACIONES = ("float16", "int8")
+# Hasta este número de textos, transform() cuenta las frecuencias con Counter en lugar de np.unique
+MAX_TEXTOS_INDICE = 16
+TOLERANCIA_EQUIVALENCIA = 1e-9
+TEXTOS_PRUEBA = (
+    "",
+    "   ",
+    "El piso estaba muy limpio y la ubicación es genial, volveríamos sin duda",
+    "Horrible. Sucio, ruidoso y el anfitrión no contestaba. NO lo recomiendo",
+    "Todo correcto, nada especial. Bien bien bien.",
+    "xyzzy qwerty palabrasinventadas 12345",
+    "Muy muy muy bonito!!! Casa CÓMODA, cama cómoda; baño: pequeño.",
+)
+
+
+def huella_archivo(path):
+    """sha256 del archivo: identifica de qué joblib se exportó el artefacto compacto."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def es_exportable(pipeline):
+    vectorizer, clf = pipeline.steps[0][1], pipeline.steps[-1][1]
+    return (
+        len(pipeline.steps) == 2
+        and hasattr(vectorizer, "vocabulary_")
+        and hasattr(vectorizer, "idf_")
+        and getattr(vectorizer, "analyzer", None) == "word"
+        and vectorizer.tokenizer is None
+        and vectorizer.preprocessor is None
+        and vectorizer.stop_words is None
+        and vectorizer.strip_accents is None
+        and hasattr(clf, "coef_")
+    )
+
+
+def _componentes(pipeline):
+    """Meta y arrays del artefacto (columnas reordenadas por término, como se guardan)."""
+    if not es_exportable(pipeline):
+        raise ValueError("Solo se exportan pipelines TfidfVectorizer (analyzer='word') + clasificador lineal")
+    vectorizer, clf = pipeline.steps[0][1], pipeline.steps[-1][1]
+    terminos = sorted(vectorizer.vocabulary_)
+    columnas = np.array([vectorizer.vocabulary_[t] for t in terminos])
+    arrays = {
+        "vocabulario": np.array(terminos, dtype=str),
+        "idf": np.asarray(vectorizer.idf_, dtype=np.float64)[columnas],
+        "coef": np.ascontiguousarray(np.asarray(clf.coef_, dtype=np.float64)[:, columnas]),
+        "intercept": np.asarray(clf.intercept_, dtype=np.float64),
+        "clases": np.asarray(clf.classes_, dtype=str),
+    }
+
+    multinomial = len(clf.classes_) > 2 and getattr(clf, "multi_class", "auto") != "ovr"
+    if type(clf).__name__ != "LogisticRegression":
+        multinomial = False
+    meta = {
+        "formato_version": FORMATO_VERSION,
+        "lowercase": bool(vectorizer.lowercase),
+        "token_pattern": vectorizer.token_pattern,
+        "ngram_range": list(vectorizer.ngram_range),
+        "binary": bool(vectorizer.binary),
+        "sublinear_tf": bool(vectorizer.sublinear_tf),
+        "use_idf": bool(vectorizer.use_idf),
+        "norm": vectorizer.norm,
+        "multinomial": multinomial,
+    }
+    return meta, arrays
+
+
+def _escala_int8(coef):
+    """Escala por clase para que el mayor |coeficiente| de cada una sea ±127."""
+    escala = np.abs(coef).max(axis=1) / 127.0
+    escala[escala == 0] = 1.0
+    return escala
+
+
+def comprimir(pipeline, umbral=0.0, cuantizacion=None):
+    """
+    Copia del pipeline sin las columnas cuyo mayor |coeficiente| entre clases es menor que
+    `umbral` (el vectorizador deja de conocer esos términos) y, con `cuantizacion`, con los
+    coeficientes redondeados a float16 o a int8 con una escala por clase. El resultado sigue
+    siendo un Pipeline de scikit-learn: predict_proba() da ya lo que dará el artefacto comprimido.
+    """
+    if cuantizacion not in (None, *CUANTIZACIONES):
+        raise ValueError(f"Cuantización no soportada: {cuantizacion} (opciones: {', '.join(CUANTIZACIONES)})")
+    if not es_exportable(pipeline):
+        raise ValueError("Solo se comprimen pipelines TfidfVectorizer (analyzer='word') + clasificador lineal")
+    comprimido = copy.deepcopy(pipeline)
+    vectorizer, clf = comprimido.steps[0][1], comprimido.steps[-1][1]
+    coef = np.asarray(clf.coef_, dtype=np.float64)
+    conservar = np.flatnonzero(np.abs(coef).max(axis=0) >= umbral)
+
+    termino_de = {c: t for t, c in vectorizer.vocabulary_.items()}
+    idf = np.asarray(vectorizer.idf_)[conservar]
+    vectorizer.vocabulary_ = {termino_de[c]: i for i, c in enumerate(conservar)}
+    vectorizer.idf_ = idf
+    if hasattr(getattr(vectorizer, "_tfidf", None), "n_features_in_"):
+        vectorizer._tfidf.n_features_in_ = len(conservar)  # el TfidfTransformer interno valida el ancho
+    if hasattr(vectorizer, "stop_words_"):
+        vectorizer.stop_words_ = set()  # solo informativo y ocupa más que el propio vocabulario
+
+    coef = coef[:, conservar]
+    if cuantizacion == "float16":
+        coef = coef.astype(np.float16).astype(np.float64)
+    elif cuantizacion == "int8":
+        escala = _escala_int8(coef)
+        coef = np.round(coef / escala[:, None]).astype(np.int8).astype(np.float64) * escala[:, None]
+    clf.coef_ = coef
+    clf.n_features_in_ = len(conservar)
+    return comprimido
+
+
+def exportar(pipeline, destino=COMPACTO_DIR, origen=None, cuantizacion=None):
+    """
+    Escribe el artefacto compacto de un pipeline TF-IDF + clasificador lineal. `origen` es el
+    joblib del que procede (se guarda su huella para detectar artefactos desactualizados).
+    Con `cuantizacion` los coeficientes se guardan en float16 o int8 (más una escala por clase);
+    tiene sentido con un pipeline ya pasado por comprimir(), cuyos coeficientes no pierden nada.
+    """
+    if cuantizacion not in (None, *CUANTIZACIONES):
+        raise ValueError(f"Cuantización no soportada: {cuantizacion} (opciones: {', '.join(CUANTIZACIONES)})")
+    meta, arrays = _componentes(pipeline)
+    if cuantizacion == "float16":
+        arrays["coef"] = arrays["coef"].astype(np.float16)
+    elif cuantizacion == "int8":
+        arrays["escala"] = _escala_int8(arrays["coef"])
+        arrays["coef"] = np.round(arrays["coef"] / arrays["escala"][:, None]).astype(np.int8)
+    destino = Path(destino)
+    destino.mkdir(parents=True, exist_ok=True)
+    (destino / "escala.npy").unlink(missing_ok=True)
+    for nombre, array in arrays.items():
+        np.save(destino / f"{nombre}.npy", array)
+    meta["cuantizacion"] = cuantizacion
+    meta["origen_sha256"] = huella_archivo(origen) if origen is not None else None
+    with open(destino / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return destino
+
+
+def tamaño_artefacto(directorio):
+    """Bytes en disco del artefacto compacto."""
+    return sum(p.stat().st_size for p in Path(directorio).iterdir() if p.is_file())
+
+
+class PredictorCompacto:
+    """Reproduce pipeline.predict_proba() con NumPy a partir del artefacto compacto."""
+
+    def __init__(self, meta, vocabulario, idf, coef, intercept, clases, escala=None):
+        self.meta = meta
+        self.vocabulario = vocabulario
+        self.idf = idf
+        self.coef = coef
+        self.escala = escala
+        self.intercept = intercept
+        self.classes_ = clases
+        self._token_re = re.compile(meta["token_pattern"])
+        self._min_n, self._max_n = meta["ngram_range"]
+        self._indice = None
+
+    @classmethod
+    def desde_pipeline(cls, pipeline):
+        """Predictor en memoria a partir del pipeline ya cargado (sin pasar por disco)."""
+        meta, arrays = _componentes(pipeline)
+        return cls(
+            meta, arrays["vocabulario"], arrays["idf"], arrays["coef"], arrays["intercept"], arrays["clases"].tolist()
+        )
+
+    @classmethod
+    def cargar(cls, directorio=COMPACTO_DIR, mmap=True):
+        directorio = Path(directorio)
+        with open(directorio / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("formato_version") not in FORMATOS_LEGIBLES:
+            raise ValueError(f"Versión de formato no soportada: {meta.get('formato_version')}")
+        modo = "r" if mmap else None
+
+        def cargar_array(nombre):
+            return np.load(directorio / f"{nombre}.npy", mmap_mode=modo)
+
+        return cls(
+            meta,
+            cargar_array("vocabulario"),
+            cargar_array("idf"),
+            cargar_array("coef"),
+            cargar_array("intercept"),
+            np.load(directorio / "clases.npy").tolist(),
+            cargar_array("escala") if meta.get("cuantizacion") == "int8" else None,
+        )
+
+    def _ngramas(self, texto):
+        """Mismo analizador 'word' que TfidfVectorizer: tokens y n-gramas unidos por espacio."""
+        if self.meta["lowercase"]:
+            texto = texto.lower()
+        tokens = self._token_re.findall(texto)
+        terminos = []
+        for n in range(self._min_n, self._max_n + 1):
+            if n == 1:
+                terminos.extend(tokens)
+            else:
+                terminos.extend(" ".join(tokens[i : i + n]) for i in range(len(tokens) - n + 1))
+        return terminos
+
+    @property
+    def indice(self):
+        """Diccionario término → columna (se construye la primera vez que se usa)."""
+        if self._indice is None:
+            self._indice = {t: i for i, t in enumerate(self.vocabulario.tolist())}
+        return self._indice
+
+    def transform(self, textos):
+        """Matriz TF-IDF dispersa como (fila, columna, valor) en arrays planos."""
+        if len(textos) <= MAX_TEXTOS_INDICE:
+            return self._transform_indice(textos)
+        indice = self.indice
+        cols, filas = [], []
+        for i, texto in enumerate(textos):
+            c = [col for col in map(indice.get, self._ngramas(str(texto))) if col is not None]
+            cols.extend(c)
+            filas.extend([i] * len(c))
+        if not cols:
+            return self._ponderar(np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([]), len(textos))
+        filas = np.array(filas, dtype=np.int64)
+        cols = np.array(cols, dtype=np.int64)
+
+        # Frecuencia de cada (fila, columna)
+        claves, tf = np.unique(filas * len(self.vocabulario) + cols, return_counts=True)
+        filas, cols = np.divmod(claves, len(self.vocabulario))
+        return self._ponderar(filas, cols, tf, len(textos))
+
+    def _transform_indice(self, textos):
+        """transform() para pocos textos: frecuencias con Counter y el diccionario de términos."""
+        indice = self.indice
+        filas, cols, tf = [], [], []
+        for i, texto in enumerate(textos):
+            conteo = Counter(indice.get(t) for t in self._ngramas(str(texto)))
+            conteo.pop(None, None)
+            for col in sorted(conteo):
+                filas.append(i)
+                cols.append(col)
+                tf.append(conteo[col])
+        # Mismo orden (fila, columna) que np.unique en la vía por arrays: mismos resultados bit a bit
+        return self._ponderar(
+            np.array(filas, dtype=np.int64), np.array(cols, dtype=np.int64), np.array(tf), len(textos)
+        )
+
+    def _ponderar(self, filas, cols, tf, n_textos):
+        valores = tf.astype(np.float64)
+        if self.meta["binary"]:
+            valores[:] = 1.0
+        elif self.meta["sublinear_tf"]:
+            valores = np.log(valores) + 1.0
+        if self.meta["use_idf"]:
+            valores *= self.idf[cols]
+        if self.meta["norm"] == "l2":
+            normas = np.sqrt(np.bincount(filas, weights=valores**2, minlength=n_textos))
+            valores /= normas[filas]
+        elif self.meta["norm"] == "l1":
+            normas = np.bincount(filas, weights=np.abs(valores), minlength=n_textos)
+            valores /= normas[filas]
+        return filas, cols, valores
+
+    def decision_desde_tfidf(self, tfidf, n_textos):
+        filas, cols, valores = tfidf
+        logits = np.tile(np.asarray(self.intercept, dtype=np.float64), (n_textos, 1))
+        coef = self.coef[:, cols].astype(np.float64, copy=False)
+        if self.escala is not None:
+            coef = coef * self.escala[:, None]
+        np.add.at(logits, filas, valores[:, None] * coef.T)
+        return logits
+
+    def decision_function(self, textos):
+        return self.decision_desde_tfidf(self.transform(textos), len(textos))
+
+    def predict_proba(self, textos):
+        return self.proba_desde_tfidf(self.transform(textos), len(textos))
+
+    def proba_desde_tfidf(self, tfidf, n_textos):
+        """predict_proba a partir de la salida de transform() (permite medir ambas etapas por separado)."""
+        logits = self.decision_desde_tfidf(tfidf, n_textos)
+        if logits.shape[1] == 1:
+            p = 1.0 / (1.0 + np.exp(-logits[:, 0]))
+            return np.column_stack([1.0 - p, p])
+        if self.meta["multinomial"]:
+            logits -= logits.max(axis=1, keepdims=True)
+            proba = np.exp(logits)
+        else:
+            proba = 1.0 / (1.0 + np.exp(-logits))
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def predict(self, textos):
+        return np.asarray(self.classes_)[self.predict_proba(textos).argmax(axis=1)]
+
+
+def artefacto_actualizado(directorio=COMPACTO_DIR, model_path=MODEL_PATH):
+    """True si existe el artefacto compacto y se exportó del joblib actual."""
+    try:
+        with open(Path(directorio) / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if not Path(model_path).exists():
+        return True
+    return meta.get("origen_sha256") == huella_archivo(model_path)
+
+
+def textos_de_prueba(predictor, n=64, semilla=0):
+    """TEXTOS_PRUEBA más textos hechos con términos del vocabulario (repetidos, mezclados y sueltos)."""
+    rng = np.random.default_rng(semilla)
+    vocabulario = predictor.vocabulario
+    textos = list(TEXTOS_PRUEBA)
+    for _ in range(n):
+        terminos = vocabulario[rng.integers(0, len(vocabulario), size=rng.integers(1, 30))].tolist()
+        textos.append(" ".join(terminos + terminos[: rng.integers(0, 5)]).upper() if rng.random() < 0.2 else " ".join(terminos))
+    return textos
+
+
+def comprobar_equivalencia(pipeline, predictor, textos=None, tolerancia=TOLERANCIA_EQUIVALENCIA):
+    """
+    Compara predictor.predict_proba() con pipeline.predict_proba() de scikit-learn, por lotes y
+    texto a texto (las dos vías de transform()). Devuelve la diferencia máxima; si supera la
+    tolerancia o no coinciden las clases, lanza ValueError.
+    """
+    textos = list(textos) if textos is not None else textos_de_prueba(predictor)
+    if list(predictor.classes_) != [str(c) for c in pipeline.classes_]:
+        raise ValueError(f"Clases distintas: {predictor.classes_} frente a {list(pipeline.classes_)}")
+    esperado = pipeline.predict_proba(textos)
+    lote = predictor.predict_proba(textos)
+    uno_a_uno = np.vstack([predictor.predict_proba([t]) for t in textos])
+    diferencia = float(max(np.abs(lote - esperado).max(), np.abs(uno_a_uno - esperado).max()))
+    if diferencia > tolerancia:
+        raise ValueError(f"El predictor compacto difiere de predict_proba en {diferencia:.3g} (tolerancia {tolerancia})")
+    return diferencia
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Exporta o verifica el artefacto compacto del modelo.")
+    parser.add_argument("--verificar", action="store_true", help="Solo compara el artefacto con el joblib.")
+    parser.add_argument("--cuantizar", choices=CUANTIZACIONES, default=None, help="Tipo de los coeficientes.")
+    args = parser.parse_args()
+    pipeline = joblib.load(MODEL_PATH)
+    if not args.verificar:
+        destino = exportar(pipeline, COMPACTO_DIR, origen=MODEL_PATH, cuantizacion=args.cuantizar)
+        print(f"Artefacto compacto guardado en {destino}")
+    diferencia = comprobar_equivalencia(pipeline, PredictorCompacto.cargar(COMPACTO_DIR))
+    print(f"Equivalente a predict_proba (diferencia máxima {diferencia:.2g})")
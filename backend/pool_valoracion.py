@@ -0,0 +1,115 @@
+"""
+Pool de procesos para valoraciones masivas. El proceso principal carga el modelo y el léxico
+y después crea los workers con fork: heredan el modelo ya cargado y comparten sus páginas de
+memoria (copy-on-write; el artefacto compacto además está en memory-map), así que no se
+deserializa nada por worker. Donde no hay fork (Windows, macOS por defecto) se usa spawn y cada
+worker carga el modelo una vez en su inicializador. Los pools que se crean con hilos ya en marcha
+(tras una recarga en caliente) usan forkserver: hacer fork de un proceso con hilos puede dejar en
+el hijo locks tomados por hilos que allí no existen.
+
+Los lotes se reparten en trozos de `chunksize` textos; por debajo de ese tamaño se valora en el
+propio proceso, porque enviar el trabajo a otro proceso costaría más que hacerlo.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+CHUNK_PROCESOS = 500
+
+
+def _nada(_):
+    return os.getpid()
+
+
+def metodo_sin_fork():
+    """Método para crear workers desde un proceso con hilos: forkserver donde exista, si no spawn."""
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def procesos_configurados(valor=None):
+    """Número de procesos de SENTIMENT_PROCESOS (o `valor`): 0 o -1 = todos los núcleos."""
+    n = int(os.environ.get("SENTIMENT_PROCESOS", 1) if valor is None else valor)
+    return (os.cpu_count() or 1) if n <= 0 else n
+
+
+class PoolProcesos:
+    def __init__(self, funcion, n_procesos, chunksize=CHUNK_PROCESOS, inicializador=None, version=None, metodo=None):
+        """
+        funcion(lista de items) -> lista de resultados; debe poder importarse por nombre.
+        `version` identifica lo que heredan los workers (el modelo cargado al crearlos).
+        `metodo` fuerza el método de arranque; salvo con fork, cada worker ejecuta `inicializador`.
+        """
+        self.funcion = funcion
+        self.n_procesos = n_procesos
+        self.chunksize = chunksize
+        self.inicializador = inicializador
+        self.version = version
+        self._metodo = metodo
+        self.lotes = 0
+        self.items = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def metodo(self):
+        if self._metodo is not None:
+            return self._metodo
+        return "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+
+    def iniciar(self):
+        """Crea los workers ya (con fork, todos a la vez y con el modelo cargado en el padre)."""
+        with self._lock:
+            if self._executor is not None:
+                return self
+            contexto = multiprocessing.get_context(self.metodo)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.n_procesos,
+                mp_context=contexto,
+                initializer=self.inicializador if self.metodo != "fork" else None,
+            )
+            # La primera tarea lanza los procesos: con fork se crean todos en este momento
+            list(self._executor.map(_nada, range(self.n_procesos)))
+        return self
+
+    def cerrar(self, cancelar=True):
+        """Termina los workers; con cancelar=False antes acaban los trozos ya enviados."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=cancelar)
+                self._executor = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def ejecutar(self, items):
+        """Resultados de funcion(items) en el mismo orden, repartidos entre los workers."""
+        items = list(items)
+        executor = self._executor
+        if executor is None or len(items) <= self.chunksize:
+            return self.funcion(items)
+        trozos = [items[i : i + self.chunksize] for i in range(0, len(items), self.chunksize)]
+        try:
+            parciales = executor.map(self.funcion, trozos)
+        except RuntimeError:
+            # Pool cerrado mientras tanto (p. ej. sustituido tras recargar el modelo)
+            return self.funcion(items)
+        resultados = []
+        for parcial in parciales:
+            resultados.extend(parcial)
+        self.lotes += 1
+        self.items += len(items)
+        return resultados
+
+    def estado(self):
+        return {
+            "procesos": self.n_procesos if self._executor is not None else 0,
+            "metodo": self.metodo,
+            "chunksize": self.chunksize,
+            "version": self.version,
+            "lotes": self.lotes,
+            "items": self.items,
+        }
@@ -0,0 +1,103 @@
+"""
+Vista en memoria de las reseñas ya valoradas, usada por /api/resenas (y acceso al almacén ya
+sincronizado para /api/listings, que lee los rollups sin pasar por la memoria).
+Las valoraciones se leen del almacén SQLite (almacen_resenas), donde se calculan una sola vez al
+escribir cada reseña. En cada consulta (como mucho una vez por INTERVALO_SINCRONIZACION) se
+importa lo añadido al corpus (el .parquet si está al día, si no el CSV), se revaloran las filas de una versión anterior del modelo y se leen
+del almacén solo las filas con un número de cambio posterior al último visto.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from almacen_resenas import AlmacenResenas
+from datos_columnares import ruta_preferida
+
+VALORACIONES = ("Positivo", "Neutro", "Negativo")
+INTERVALO_SINCRONIZACION = 1.0
+
+
+def _indexar(filas):
+    por_valoracion = defaultdict(list)
+    por_listing = defaultdict(list)
+    for pos, fila in enumerate(filas):
+        por_valoracion[fila["valoracion"]].append(pos)
+        por_listing[fila["listing_id"]].append(pos)
+    return dict(por_valoracion), dict(por_listing)
+
+
+class ResenasStore:
+    def __init__(self, data_path, almacen=None):
+        self.data_path = data_path
+        self.almacen = almacen if almacen is not None else AlmacenResenas()
+        self._lock = threading.Lock()
+        self._sincronizado = 0.0
+        self._leido = 0.0
+        # (ultimo_cambio, filas, posiciones_por_valoracion, posiciones_por_listing); se sustituye entero
+        self._snapshot = (0, [], {}, {})
+        self._posicion_por_id = {}
+
+    def almacen_al_dia(self):
+        """
+        El almacén con lo nuevo del corpus importado y las filas de otra versión del modelo
+        revaloradas (como mucho una comprobación por INTERVALO_SINCRONIZACION).
+        """
+        if time.monotonic() - self._sincronizado >= INTERVALO_SINCRONIZACION:
+            with self._lock:
+                if time.monotonic() - self._sincronizado >= INTERVALO_SINCRONIZACION:
+                    self.almacen.sincronizar(ruta_preferida(self.data_path))
+                    self.almacen.revalorar_obsoletas()
+                    self._sincronizado = time.monotonic()
+        return self.almacen
+
+    def _leer_cambios(self):
+        ultimo, filas, por_valoracion, por_listing = self._snapshot
+        nuevas = self.almacen.leer_desde(ultimo)
+        if not nuevas:
+            return
+        filas = list(filas)
+        solo_altas = True
+        for fila in nuevas:
+            ultimo = max(ultimo, fila.pop("cambio"))
+            fila["estrellas_emoji"] = "★" * fila["estrellas"] + "☆" * (5 - fila["estrellas"])
+            pos = self._posicion_por_id.get(fila["id"])
+            if pos is None:
+                self._posicion_por_id[fila["id"]] = len(filas)
+                filas.append(fila)
+            else:
+                filas[pos] = fila
+                solo_altas = False
+        if solo_altas:
+            # Altas al final: basta con extender los índices con las posiciones nuevas
+            por_valoracion = {k: list(v) for k, v in por_valoracion.items()}
+            por_listing = {k: list(v) for k, v in por_listing.items()}
+            for pos in range(len(self._snapshot[1]), len(filas)):
+                por_valoracion.setdefault(filas[pos]["valoracion"], []).append(pos)
+                por_listing.setdefault(filas[pos]["listing_id"], []).append(pos)
+        else:
+            por_valoracion, por_listing = _indexar(filas)
+        self._snapshot = (ultimo, filas, por_valoracion, por_listing)
+
+    def _datos(self):
+        if time.monotonic() - self._leido < INTERVALO_SINCRONIZACION:
+            return self._snapshot
+        self.almacen_al_dia()
+        with self._lock:
+            if time.monotonic() - self._leido >= INTERVALO_SINCRONIZACION:
+                self._leer_cambios()
+                self._leido = time.monotonic()
+            return self._snapshot
+
+    def consultar(self, offset=0, limite=200, valoracion=None, listing_id=None):
+        """Devuelve (filas de la página, total de filas que cumplen los filtros)."""
+        _, filas, por_valoracion, por_listing = self._datos()
+        if valoracion is not None and listing_id is not None:
+            en_listing = por_listing.get(str(listing_id), [])
+            posiciones = [p for p in en_listing if filas[p]["valoracion"] == valoracion]
+        elif valoracion is not None:
+            posiciones = por_valoracion.get(valoracion, [])
+        elif listing_id is not None:
+            posiciones = por_listing.get(str(listing_id), [])
+        else:
+            posiciones = range(len(filas))
+        return [filas[p] for p in posiciones[offset : offset + limite]], len(posiciones)
@@ -1,120 +1,465 @@
 """
 Motor de valoración de reseñas: carga el modelo y expone valorar_reseña().
 La intensidad de las palabras viene del diccionario (-3 a +3).
-Frases ambiguas (ej. "buena mierda" = positivo) se corrigen con data/frases_sentimiento.csv.
+Frases ambiguas (ej. "buena mierda" = positivo) se corrigen con data/frases_sentimiento.csv,
+a través del motor de léxico compartido con train_model.py (lexico.Lexico).
+
+Modelo y léxico se recargan en caliente: cuando cambia el mtime de alguno de sus archivos (o con
+recargar(), que usa POST /api/admin/reload) se cargan en un hilo aparte mientras se sigue
+valorando con los anteriores, y se activan los dos a la vez al terminar.
 """
-import re
-import joblib
-import pandas as pd
+import hashlib
+import os
+import threading
+import time
+import numpy as np
 from pathlib import Path
 
+from cache_lru import CacheLRU
+from lexico import Lexico
+from metricas import medir, observar_tamaño, perfilador, registro
+from modelo_compacto import PredictorCompacto, artefacto_actualizado, comprobar_equivalencia, es_exportable
+from pool_valoracion import CHUNK_PROCESOS, PoolProcesos, metodo_sin_fork, procesos_configurados
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 MODEL_PATH = BASE_DIR / "model" / "sentiment_pipeline.joblib"
+COMPACTO_DIR = BASE_DIR / "model" / "sentiment_compacto"
 DATA_DIR = BASE_DIR / "data"
+DICCIONARIO_PATH = DATA_DIR / "diccionario_extenso.csv"
+FRASES_PATH = DATA_DIR / "frases_sentimiento.csv"
+
+# Archivos cuyo cambio invalida la caché de resultados
+ARCHIVOS_VERSIONADOS = (MODEL_PATH, COMPACTO_DIR / "meta.json", DICCIONARIO_PATH, FRASES_PATH)
+ARCHIVOS_LEXICO = (DICCIONARIO_PATH, FRASES_PATH)
+# Cada cuánto (segundos) se vuelve a mirar el mtime de esos archivos como máximo
+INTERVALO_VERSION = 1.0
 
 PUNTUACION_POR_CLASE = {"Negativo": 0, "Neutro": 2.5, "Positivo": 5}
 
-_pipeline = None
-_lexico = None
-_frases_lexico = None
+cache_resultados = CacheLRU(int(os.environ.get("SENTIMENT_CACHE_MAX", 10000)))
+_version = None
+_version_comprobada = 0.0
+_huellas = {}
+_pool = None
 
+_activo = None
+_carga_lock = threading.Lock()
+_recarga_lock = threading.Lock()
+_hilo_recarga = None
+_recarga = {"recargas": 0, "ultimo_error": None, "version_fallida": None}
 
-def _cargar_lexicos():
-    global _lexico, _frases_lexico
-    if _lexico is not None:
-        return
-    _lexico = {}
-    _frases_lexico = {}
+
+class ModeloActivo:
+    """Modelo + léxico cargados juntos y su versión. Nunca se modifica: al recargar se sustituye entero."""
+
+    __slots__ = ("pipeline", "lexico", "version", "huella", "huella_lexico", "desde")
+
+    def __init__(self, pipeline, lexico, version, huella, huella_lexico):
+        self.pipeline = pipeline
+        self.lexico = lexico
+        self.version = version
+        self.huella = huella
+        self.huella_lexico = huella_lexico
+        self.desde = time.time()
+
+
+def _mtimes():
+    mtimes = []
+    for path in ARCHIVOS_VERSIONADOS:
+        try:
+            mtimes.append(path.stat().st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+
+def version_artefactos():
+    """Versión en disco de modelo + léxico: mtimes de los archivos de los que dependen los resultados."""
+    global _version, _version_comprobada
+    ahora = time.monotonic()
+    if _version is None or ahora - _version_comprobada >= INTERVALO_VERSION:
+        _version = _mtimes()
+        _version_comprobada = ahora
+    return _version
+
+
+def _huella(paths):
+    """sha256 corto del contenido de los archivos; solo se recalcula si cambia algún mtime."""
+    clave = []
+    for path in paths:
+        try:
+            clave.append((str(path), path.stat().st_mtime_ns))
+        except OSError:
+            clave.append((str(path), None))
+    clave = tuple(clave)
+    if clave not in _huellas:
+        h = hashlib.sha256()
+        for path, mtime in clave:
+            if mtime is not None:
+                h.update(Path(path).read_bytes())
+            h.update(b"\0")
+        _huellas[clave] = h.hexdigest()[:16]
+    return _huellas[clave]
+
+
+def version_valoracion():
+    """Identificador persistible del modelo + léxico activos (se guarda con cada reseña valorada)."""
+    return modelo_activo().huella
+
+
+def version_lexico():
+    """Identificador del diccionario + frases activos (etiquetas de entrenamiento)."""
+    return modelo_activo().huella_lexico
+
+
+def _cargar_modelo(version):
+    """
+    Lee modelo y léxico de disco. Si hay artefacto compacto exportado del joblib actual se usa ese
+    (memory-map, sin scikit-learn); si no, se deserializa el pipeline y se extraen de él los mismos
+    arrays (_predictor_rapido).
+    Las huellas se toman antes de leer: si un archivo cambia durante la carga, su mtime ya no
+    coincidirá con `version` y se volverá a cargar.
+    """
+    huella, huella_lexico = _huella(ARCHIVOS_VERSIONADOS), _huella(ARCHIVOS_LEXICO)
+    inicio = time.perf_counter()
+    pipeline = None
+    if artefacto_actualizado(COMPACTO_DIR, MODEL_PATH):
+        pipeline = PredictorCompacto.cargar(COMPACTO_DIR)
+    elif MODEL_PATH.exists():
+        import joblib  # solo sin artefacto compacto al día (joblib y scikit-learn tardan en importarse)
+
+        pipeline = _predictor_rapido(joblib.load(MODEL_PATH))
+    if isinstance(pipeline, PredictorCompacto):
+        pipeline.indice  # diccionario de términos para las peticiones de una reseña, ya construido
+    registro.fijar("sentiment_modelo_carga_segundos", round(time.perf_counter() - inicio, 6))
     try:
-        dicc = pd.read_csv(DATA_DIR / "diccionario_extenso.csv")
-        _lexico = dict(zip(dicc["Palabra"].str.lower().str.strip(), dicc["Sentimiento"]))
+        lexico = Lexico.desde_csv(DICCIONARIO_PATH, FRASES_PATH)
     except Exception:
-        pass
+        lexico = Lexico()
+    return ModeloActivo(pipeline, lexico, version, huella, huella_lexico)
+
+
+def _predictor_rapido(pipeline):
+    """
+    El mismo modelo sin pasar por scikit-learn en cada petición (PredictorCompacto en memoria),
+    si el pipeline es exportable y su predict_proba coincide con el original; si no, el pipeline.
+    """
+    if not es_exportable(pipeline):
+        return pipeline
+    predictor = PredictorCompacto.desde_pipeline(pipeline)
     try:
-        frases_df = pd.read_csv(DATA_DIR / "frases_sentimiento.csv")
-        for _, row in frases_df.iterrows():
-            palabras_frase = tuple(str(row["Frase"]).lower().strip().split())
-            if len(palabras_frase) >= 2:
-                _frases_lexico[palabras_frase] = int(row["Sentimiento"])
-    except Exception:
-        pass
-
-
-def _score_lexico_con_frases(texto):
-    """Devuelve la puntuación del texto usando diccionario + frases (misma lógica que entrenamiento)."""
-    _cargar_lexicos()
-    palabras = re.findall(r"\b\w+\b", str(texto).lower())
-    if not palabras:
-        return 0
-    used = set()
-    score = 0
-    for n in (3, 2):
-        if n > len(palabras):
-            continue
-        for i in range(len(palabras) - n + 1):
-            if any(i + k in used for k in range(n)):
-                continue
-            ngram = tuple(palabras[i : i + n])
-            if ngram in _frases_lexico:
-                score += _frases_lexico[ngram]
-                for k in range(n):
-                    used.add(i + k)
-    for i, p in enumerate(palabras):
-        if i not in used:
-            score += _lexico.get(p, 0)
-    return score
+        comprobar_equivalencia(pipeline, predictor)
+    except ValueError:
+        registro.incrementar("sentiment_modelo_equivalencia_fallida_total")
+        return pipeline
+    return predictor
+
+
+def modelo_activo():
+    """El modelo y léxico en uso; la primera vez se cargan en el hilo que los pide."""
+    global _activo
+    if _activo is None:
+        with _carga_lock:
+            if _activo is None:
+                _activo = _cargar_modelo(_mtimes())
+                cache_resultados.asegurar_version(_activo.huella)
+    return _activo
 
 
 def get_pipeline():
-    global _pipeline
-    if _pipeline is None and MODEL_PATH.exists():
-        _pipeline = joblib.load(MODEL_PATH)
-    return _pipeline
+    """Modelo para inferencia (el de la versión activa)."""
+    return modelo_activo().pipeline
 
 
-def valorar_reseña(texto):
-    pipeline = get_pipeline()
-    t = str(texto).strip().lower() or " "
-    if pipeline is None:
-        score = _score_lexico_con_frases(t)
-        if score > 0:
-            estrellas, valoracion = 4, "Positivo"
-        elif score < 0:
-            estrellas, valoracion = 1, "Negativo"
-        else:
-            estrellas, valoracion = 3, "Neutro"
-        return {
-            "estrellas": estrellas,
-            "puntuacion_media": 2.5 if valoracion == "Neutro" else (5.0 if valoracion == "Positivo" else 0.0),
-            "valoracion": valoracion,
-            "estrellas_emoji": "★" * estrellas + "☆" * (5 - estrellas),
-        }
-
-    proba = pipeline.predict_proba([t])[0]
-    clases = pipeline.classes_
-    puntuacion_media = sum(
-        PUNTUACION_POR_CLASE.get(clases[i], 2.5) * proba[i] for i in range(len(clases))
+def _cargar_lexicos():
+    return modelo_activo().lexico
+
+
+def comprobar_cambios():
+    """
+    Modelo activo para valorar un lote. Si los archivos en disco ya no son los suyos, lanza la
+    recarga en segundo plano y, mientras tanto, sigue devolviendo el actual.
+    """
+    activo = modelo_activo()
+    version = version_artefactos()
+    if version != activo.version and version != _recarga["version_fallida"]:
+        recargar()
+    return activo
+
+
+def recargar(esperar=False, forzar=False):
+    """
+    Carga modelo y léxico de disco en un hilo y los activa de una vez cuando están listos. Sin
+    `forzar`, si el contenido no ha cambiado (solo el mtime) se conserva lo cargado.
+    Con `esperar` bloquea hasta terminar. Devuelve estado_modelo().
+    """
+    global _hilo_recarga
+    with _recarga_lock:
+        if _hilo_recarga is None or not _hilo_recarga.is_alive():
+            _hilo_recarga = threading.Thread(target=_recargar, args=(forzar,), name="recarga-modelo", daemon=True)
+            _hilo_recarga.start()
+        hilo = _hilo_recarga
+    if esperar:
+        hilo.join()
+    return estado_modelo()
+
+
+def _recargar(forzar):
+    global _activo
+    with _carga_lock:
+        version = _mtimes()
+        anterior = _activo
+        try:
+            mismo_contenido = anterior is not None and (anterior.huella, anterior.huella_lexico) == (
+                _huella(ARCHIVOS_VERSIONADOS),
+                _huella(ARCHIVOS_LEXICO),
+            )
+            if mismo_contenido and not forzar:
+                nuevo = ModeloActivo(anterior.pipeline, anterior.lexico, version, anterior.huella, anterior.huella_lexico)
+                nuevo.desde = anterior.desde
+            else:
+                nuevo = _cargar_modelo(version)
+        except Exception as e:
+            # Archivo a medio escribir o corrupto: se sigue con el anterior hasta el próximo cambio
+            _recarga["ultimo_error"] = f"{type(e).__name__}: {e}"
+            _recarga["version_fallida"] = version
+            registro.incrementar("sentiment_modelo_recargas_fallidas_total")
+            return
+        _activo = nuevo
+        cache_resultados.asegurar_version(nuevo.huella)
+        _recarga["ultimo_error"] = None
+        _recarga["version_fallida"] = None
+        renovar = not mismo_contenido or forzar
+        if renovar:
+            _recarga["recargas"] += 1
+            registro.incrementar("sentiment_modelo_recargas_total")
+    # Fuera del lock: crear los workers no bloquea a quien espera el modelo activo
+    if renovar:
+        _renovar_pool()
+
+
+def modelo_cargado():
+    return _activo is not None
+
+
+def modelo_disponible():
+    """Si hay modelo entrenado con que valorar, sin cargarlo si aún no se ha cargado."""
+    activo = _activo
+    if activo is not None:
+        return activo.pipeline is not None
+    return MODEL_PATH.exists() or (COMPACTO_DIR / "meta.json").exists()
+
+
+def estado_modelo():
+    """Versión y estado del modelo activo (no lo carga: antes de la primera carga, cargado=False)."""
+    activo = _activo
+    return {
+        "cargado": activo is not None and activo.pipeline is not None,
+        "tipo": type(activo.pipeline).__name__ if activo is not None and activo.pipeline is not None else None,
+        "version": activo.huella if activo is not None else None,
+        "version_lexico": activo.huella_lexico if activo is not None else None,
+        "activo_desde": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(activo.desde)) if activo else None,
+        "recargando": _hilo_recarga is not None and _hilo_recarga.is_alive(),
+        "recargas": _recarga["recargas"],
+        "ultimo_error": _recarga["ultimo_error"],
+    }
+
+
+def precargar():
+    """Carga ya el modelo y el léxico (antes de crear los procesos del pool o de la primera petición)."""
+    modelo_activo()
+
+
+def precalentar():
+    """
+    precargar() y una valoración de prueba (sin pasar por la caché), para que la primera petición
+    real no pague la carga ni la primera pasada por el diccionario de términos y NumPy.
+    Devuelve False si falla (el error queda en estado_modelo()["ultimo_error"]).
+    """
+    try:
+        _valorar_normalizados(["precalentamiento del modelo"], modelo_activo())
+    except Exception as e:
+        _recarga["ultimo_error"] = f"{type(e).__name__}: {e}"
+        return False
+    return True
+
+
+def iniciar_pool(n_procesos=None):
+    """
+    Pool de procesos para los lotes grandes de valorar_reseñas() (SENTIMENT_PROCESOS o
+    `n_procesos`; 0 o -1 = todos los núcleos, 1 = sin pool). El modelo se carga aquí, antes
+    del fork, para que los workers lo compartan en lugar de cargar cada uno su copia.
+    """
+    global _pool
+    n = procesos_configurados(n_procesos)
+    if _pool is None and n > 1:
+        _pool = _nuevo_pool(n, int(os.environ.get("SENTIMENT_PROCESOS_CHUNK", CHUNK_PROCESOS)))
+    return _pool
+
+
+def _nuevo_pool(n_procesos, chunksize, metodo=None):
+    activo = modelo_activo()
+    pool = PoolProcesos(
+        _valorar_normalizados, n_procesos, chunksize, inicializador=precargar, version=activo.huella, metodo=metodo
     )
-    estrellas = round(puntuacion_media)
-    estrellas = max(0, min(5, estrellas))
-    if estrellas <= 1:
-        valoracion = "Negativo"
-    elif estrellas <= 3:
-        valoracion = "Neutro"
-    else:
-        valoracion = "Positivo"
+    return pool.iniciar()
+
+
+def _renovar_pool():
+    """
+    Tras una recarga, workers nuevos con el modelo nuevo; el pool viejo termina lo que tenga en curso.
+    Se llama desde el hilo de recarga, con el servidor ya en marcha: los workers no se crean con fork
+    sino con forkserver (o spawn) y cargan el artefacto actual en su inicializador.
+    """
+    global _pool
+    viejo = _pool
+    if viejo is not None:
+        _pool = _nuevo_pool(viejo.n_procesos, viejo.chunksize, metodo=metodo_sin_fork())
+        viejo.cerrar(cancelar=False)
 
-    # Corrección por frases ambiguas: si el lexico+frases sugiere lo contrario, corregir
-    score_frases = _score_lexico_con_frases(t)
-    if score_frases >= 2 and valoracion == "Negativo":
-        estrellas, puntuacion_media, valoracion = 4, 4.0, "Positivo"
-    elif score_frases <= -2 and valoracion == "Positivo":
-        estrellas, puntuacion_media, valoracion = 1, 1.0, "Negativo"
 
-    estrellas_emoji = "★" * estrellas + "☆" * (5 - estrellas)
+def cerrar_pool():
+    global _pool
+    if _pool is not None:
+        _pool.cerrar()
+        _pool = None
+
+
+def estado_pool():
+    return _pool.estado() if _pool is not None else {"procesos": 0}
+
+
+def _predict_proba_por_etapas(pipeline, ts):
+    """predict_proba separado en TF-IDF y clasificador para medir cada etapa."""
+    if isinstance(pipeline, PredictorCompacto):
+        with medir("tfidf"):
+            tfidf = pipeline.transform(ts)
+        with medir("predict_proba"):
+            return pipeline.proba_desde_tfidf(tfidf, len(ts))
+    with medir("tfidf"):
+        X = pipeline[:-1].transform(ts)
+    with medir("predict_proba"):
+        return pipeline[-1].predict_proba(X)
+
+
+def _resultado(estrellas, puntuacion_media, valoracion):
     return {
         "estrellas": estrellas,
-        "puntuacion_media": round(puntuacion_media, 2),
+        "puntuacion_media": puntuacion_media,
         "valoracion": valoracion,
-        "estrellas_emoji": estrellas_emoji,
+        "estrellas_emoji": "★" * estrellas + "☆" * (5 - estrellas),
     }
+
+
+def _valoracion_por_lexico(score):
+    if score > 0:
+        return _resultado(4, 5.0, "Positivo")
+    if score < 0:
+        return _resultado(1, 0.0, "Negativo")
+    return _resultado(3, 2.5, "Neutro")
+
+
+def valorar_reseñas(textos):
+    """
+    Valora una lista de reseñas en bloque: un único predict_proba vectorizado para
+    todo el lote y la corrección por frases aplicada fila a fila sobre el resultado.
+    Devuelve exactamente lo mismo que llamar a valorar_reseña() con cada texto.
+    Los textos ya valorados (mismo texto normalizado, misma versión de modelo y léxico)
+    salen de la caché LRU; solo los textos nuevos y distintos llegan al modelo.
+    """
+    return _valorar_con(textos, comprobar_cambios())
+
+
+def valorar_con_version(textos):
+    """
+    valorar_reseñas() y etiquetar_reseñas() con un mismo modelo activo, más las versiones de ese
+    modelo y de su léxico. Lo que se guarda junto a cada reseña es siempre la versión que la valoró,
+    aunque entre tanto se active otra. Devuelve (valoraciones, etiquetas, versión, versión del léxico).
+    Es la vía de las escrituras masivas (importación, revaloración): no pasa por la caché LRU, para
+    no expulsar con cada bloque de reseñas los textos frecuentes de las peticiones.
+    """
+    activo = comprobar_cambios()
+    etiquetas = activo.lexico.etiquetar_many(textos).tolist()
+    return _valorar_con(textos, activo, usar_cache=False), etiquetas, activo.huella, activo.huella_lexico
+
+
+def _valorar_con(textos, activo, usar_cache=True):
+    ts = [str(texto).strip().lower() or " " for texto in textos]
+    observar_tamaño("sentiment_lote_tamano", len(ts))
+    if usar_cache:
+        with medir("cache"):
+            resultados = [cache_resultados.get(t, activo.huella) for t in ts]
+    else:
+        resultados = [None] * len(ts)
+    pendientes = list(dict.fromkeys(t for t, r in zip(ts, resultados) if r is None))
+    if pendientes:
+        nuevos = dict(zip(pendientes, _valorar_pendientes(pendientes, activo)))
+        if usar_cache:
+            for t, r in nuevos.items():
+                cache_resultados.put(t, r, activo.huella)
+        resultados = [nuevos[t] if r is None else r for t, r in zip(ts, resultados)]
+    return [dict(r) for r in resultados]
+
+
+def _valorar_pendientes(ts, activo):
+    """
+    Los lotes mayores que un trozo del pool se reparten entre procesos (si sus workers tienen la
+    misma versión del modelo que se usa para la caché); el resto, aquí.
+    """
+    pool = _pool
+    if pool is not None and pool.version == activo.huella and len(ts) > pool.chunksize:
+        with medir("pool"):
+            return pool.ejecutar(ts)
+    return perfilador.llamar("valorar", _valorar_normalizados, ts, activo)
+
+
+def _valorar_normalizados(ts, activo=None):
+    activo = activo or modelo_activo()
+    lexico = activo.lexico
+    with medir("lexico"):
+        scores = lexico.score_many(ts)
+    pipeline = activo.pipeline
+    if pipeline is None:
+        return [_valoracion_por_lexico(score) for score in scores]
+
+    proba = _predict_proba_por_etapas(pipeline, ts)
+    valores = np.array([PUNTUACION_POR_CLASE.get(c, 2.5) for c in pipeline.classes_])
+    medias = proba @ valores
+
+    with medir("postproceso"):
+        return _combinar(medias.tolist(), scores)
+
+
+def _combinar(medias, scores):
+    resultados = []
+    for puntuacion_media, score_frases in zip(medias, scores):
+        estrellas = max(0, min(5, round(puntuacion_media)))
+        if estrellas <= 1:
+            valoracion = "Negativo"
+        elif estrellas <= 3:
+            valoracion = "Neutro"
+        else:
+            valoracion = "Positivo"
+
+        # Corrección por frases ambiguas: si el lexico+frases sugiere lo contrario, corregir
+        if score_frases >= 2 and valoracion == "Negativo":
+            estrellas, puntuacion_media, valoracion = 4, 4.0, "Positivo"
+        elif score_frases <= -2 and valoracion == "Positivo":
+            estrellas, puntuacion_media, valoracion = 1, 1.0, "Negativo"
+        resultados.append(_resultado(estrellas, round(puntuacion_media, 2), valoracion))
+    return resultados
+
+
+def etiquetar_reseñas(textos):
+    """Etiqueta de sentimiento por léxico (la misma con que train_model.py etiqueta los datos)."""
+    return _cargar_lexicos().etiquetar_many(textos).tolist()
+
+
+def etiquetar_con_version(textos):
+    """etiquetar_reseñas() y la versión del léxico que etiquetó, tomadas del mismo modelo activo."""
+    activo = modelo_activo()
+    return activo.lexico.etiquetar_many(textos).tolist(), activo.huella_lexico
+
+
+def valorar_reseña(texto):
+    return valorar_reseñas([texto])[0]
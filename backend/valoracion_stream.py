@@ -0,0 +1,237 @@
+"""
+Valoración en streaming de archivos NDJSON o CSV con memoria acotada: los registros se leen
+línea a línea, se valoran en bloques de tamaño fijo con valorar_reseñas() y cada bloque se
+escribe en cuanto está listo, en el mismo formato de entrada con las columnas de la valoración
+añadidas. Lo usan POST /api/valorar/stream y la línea de comandos:
+
+    python backend/valoracion_stream.py reseñas.csv -o valoradas.csv
+    cat reseñas.ndjson | python backend/valoracion_stream.py - --formato ndjson > valoradas.ndjson
+    python backend/valoracion_stream.py reseñas.csv -o valoradas.csv --procesos -1   # todos los núcleos
+
+En NDJSON cada línea es un objeto con el texto en "texto" (o "comments") o directamente una
+cadena JSON; en CSV el texto va en la columna comments (o texto). Con `columna` se elige otra.
+Las líneas que no se pueden valorar (JSON inválido, texto vacío) salen con un campo "error".
+"""
+import asyncio
+import codecs
+import csv
+import io
+import json
+import sys
+from itertools import islice
+
+from sentiment_engine import cerrar_pool, iniciar_pool, valorar_reseñas
+
+TAMAÑO_BLOQUE = 512
+MAX_BLOQUE = 5000
+FORMATOS = ("ndjson", "csv")
+COLUMNAS_TEXTO = ("texto", "comments")
+CAMPOS_RESULTADO = ("estrellas", "puntuacion_media", "valoracion", "estrellas_emoji", "error")
+
+
+def formato_de(nombre_o_tipo, defecto="ndjson"):
+    """Formato a partir de una extensión de archivo o un Content-Type."""
+    valor = (nombre_o_tipo or "").lower()
+    if "csv" in valor:
+        return "csv"
+    if "json" in valor:
+        return "ndjson"
+    return defecto
+
+
+def _columna_texto(campos, columna):
+    if columna is not None:
+        return columna
+    return next((c for c in COLUMNAS_TEXTO if c in campos), COLUMNAS_TEXTO[0])
+
+
+def parsear_ndjson(lineas):
+    """Registros (dict) de un bloque de líneas NDJSON; las inválidas llevan "error"."""
+    registros = []
+    for linea in lineas:
+        try:
+            valor = json.loads(linea)
+        except ValueError:
+            registros.append({"error": "JSON inválido", "linea": linea[:200]})
+            continue
+        if isinstance(valor, str):
+            valor = {"texto": valor}
+        elif not isinstance(valor, dict):
+            registros.append({"error": "Se esperaba un objeto o una cadena JSON"})
+            continue
+        registros.append(valor)
+    return registros
+
+
+def parsear_csv(registros_texto, cabecera):
+    """Registros de un bloque de filas CSV completas (cada una puede contener saltos entre comillas)."""
+    return list(csv.DictReader(registros_texto, fieldnames=cabecera))
+
+
+def valorar_bloque(registros, columna=None):
+    """Añade a cada registro su valoración; un único valorar_reseñas() para todo el bloque."""
+    validos, textos = [], []
+    for registro in registros:
+        if "error" in registro:
+            continue
+        texto = registro.get(_columna_texto(registro, columna))
+        if texto is None or not str(texto).strip():
+            registro["error"] = "Texto vacío"
+            continue
+        validos.append(registro)
+        textos.append(texto)
+    for registro, valoracion in zip(validos, valorar_reseñas(textos)):
+        registro.update(valoracion)
+    return registros
+
+
+def serializar_ndjson(registros):
+    return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in registros)
+
+
+def serializar_csv(registros, columnas, cabecera=False):
+    salida = io.StringIO()
+    writer = csv.DictWriter(salida, fieldnames=columnas, extrasaction="ignore", lineterminator="\n")
+    if cabecera:
+        writer.writeheader()
+    writer.writerows(registros)
+    return salida.getvalue()
+
+
+def columnas_salida(cabecera):
+    return list(cabecera) + [c for c in CAMPOS_RESULTADO if c not in cabecera]
+
+
+def agrupar_filas_csv(lineas):
+    """
+    Une las líneas de una misma fila CSV (campos entre comillas con saltos de línea): una fila
+    está completa cuando el número de comillas acumulado es par ("" cuenta como dos).
+    """
+    pendiente, comillas = [], 0
+    for linea in lineas:
+        pendiente.append(linea)
+        comillas += linea.count('"')
+        if comillas % 2 == 0:
+            yield "".join(pendiente)
+            pendiente, comillas = [], 0
+    if pendiente:
+        yield "".join(pendiente)
+
+
+def _bloques(iterable, tamaño):
+    iterador = iter(iterable)
+    while bloque := list(islice(iterador, tamaño)):
+        yield bloque
+
+
+def valorar_lineas(lineas, formato="ndjson", columna=None, tamaño_bloque=TAMAÑO_BLOQUE):
+    """
+    Generador síncrono: líneas de entrada (con su salto) → trozos de texto de salida, un trozo
+    por bloque. En memoria solo hay un bloque a la vez.
+    """
+    if formato == "ndjson":
+        no_vacias = (l for l in lineas if l.strip())
+        for bloque in _bloques(no_vacias, tamaño_bloque):
+            yield serializar_ndjson(valorar_bloque(parsear_ndjson(bloque), columna))
+        return
+
+    filas = agrupar_filas_csv(lineas)
+    primera = next(filas, None)
+    if primera is None:
+        return
+    cabecera = next(csv.reader([primera]))
+    columnas = columnas_salida(cabecera)
+    yield serializar_csv([], columnas, cabecera=True)
+    for bloque in _bloques((f for f in filas if f.strip()), tamaño_bloque):
+        yield serializar_csv(valorar_bloque(parsear_csv(bloque, cabecera), columna), columnas)
+
+
+async def lineas_async(trozos):
+    """Líneas de texto (con su salto) a partir de trozos de bytes UTF-8 de un cuerpo en streaming."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    resto = ""
+    async for trozo in trozos:
+        texto = resto + decoder.decode(trozo)
+        lineas = texto.split("\n")
+        resto = lineas.pop()
+        for linea in lineas:
+            yield linea + "\n"
+    resto += decoder.decode(b"", final=True)
+    if resto:
+        yield resto
+
+
+async def valorar_stream(trozos, formato="ndjson", columna=None, tamaño_bloque=TAMAÑO_BLOQUE):
+    """
+    Versión asíncrona para la API: lee el cuerpo mientras llega y emite cada bloque valorado
+    sin esperar al final de la subida. La valoración de cada bloque corre en un hilo para no
+    bloquear el bucle de eventos.
+    """
+    lineas = lineas_async(trozos)
+    bloque, comillas, pendiente = [], 0, []
+    cabecera = columnas = None
+
+    def procesar(bloque):
+        if formato == "ndjson":
+            return serializar_ndjson(valorar_bloque(parsear_ndjson(bloque), columna))
+        return serializar_csv(valorar_bloque(parsear_csv(bloque, cabecera), columna), columnas)
+
+    async for linea in lineas:
+        if formato == "csv":
+            # Misma regla que agrupar_filas_csv(): la fila termina con un número par de comillas
+            pendiente.append(linea)
+            comillas += linea.count('"')
+            if comillas % 2:
+                continue
+            linea, pendiente, comillas = "".join(pendiente), [], 0
+            if cabecera is None:
+                cabecera = next(csv.reader([linea]))
+                columnas = columnas_salida(cabecera)
+                yield serializar_csv([], columnas, cabecera=True)
+                continue
+        if not linea.strip():
+            continue
+        bloque.append(linea)
+        if len(bloque) >= tamaño_bloque:
+            yield await asyncio.to_thread(procesar, bloque)
+            bloque = []
+    if pendiente and cabecera is not None:
+        bloque.append("".join(pendiente))
+    if bloque and (formato == "ndjson" or cabecera is not None):
+        yield await asyncio.to_thread(procesar, bloque)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Valora reseñas de un archivo NDJSON o CSV en streaming.")
+    parser.add_argument("entrada", help="Archivo de entrada ('-' para la entrada estándar).")
+    parser.add_argument("-o", "--salida", default="-", help="Archivo de salida ('-' para la salida estándar).")
+    parser.add_argument("--formato", choices=FORMATOS, default=None, help="Por defecto, según la extensión.")
+    parser.add_argument("--columna", default=None, help="Campo o columna con el texto de la reseña.")
+    parser.add_argument("--bloque", type=int, default=None, help="Reseñas por llamada al modelo.")
+    parser.add_argument(
+        "--procesos", type=int, default=None,
+        help="Procesos para valorar cada bloque (-1 = todos los núcleos; por defecto SENTIMENT_PROCESOS).",
+    )
+    args = parser.parse_args(argv)
+    formato = args.formato or formato_de(args.entrada if args.entrada != "-" else "")
+    pool = iniciar_pool(args.procesos)
+    # Con pool, cada bloque se parte en un trozo por proceso
+    bloque = args.bloque or (pool.n_procesos * pool.chunksize if pool else TAMAÑO_BLOQUE)
+
+    entrada = sys.stdin if args.entrada == "-" else open(args.entrada, encoding="utf-8", newline="")
+    salida = sys.stdout if args.salida == "-" else open(args.salida, "w", encoding="utf-8", newline="")
+    try:
+        for trozo in valorar_lineas(entrada, formato, args.columna, bloque):
+            salida.write(trozo)
+    finally:
+        cerrar_pool()
+        if entrada is not sys.stdin:
+            entrada.close()
+        if salida is not sys.stdout:
+            salida.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+Benchmarks de rendimiento del proyecto, reproducibles y sin red. Genera un corpus sintético
+de reseñas en español a partir de los CSV de data/ y las plantillas de
+scripts/generar_resenas_negativas_neutras.py, y mide:
+
+- lexico:        throughput del etiquetado con el léxico (texto a texto y en bloque)
+- entrenamiento: tiempo total y pico de memoria (RSS) de train_model.py sobre el corpus
+- carga:         arranque en frío del modelo (joblib completo y artefacto compacto)
+- arranque:      arranque de la API: import de main.py (y si carga pandas/joblib/sklearn), tiempo
+                 hasta /api/health/ready y primera valoración con y sin precalentamiento
+- datos:         lectura del corpus: CSV completo, solo comments del CSV y solo comments del Parquet
+- inferencia:    valorar_reseña texto a texto frente a valorar_reseñas en lote, y latencia de
+                 predict_proba de una reseña con el Pipeline de sklearn frente al predictor compacto
+- api:           percentiles de latencia de la API en proceso (TestClient)
+
+Los resultados se escriben en JSON para comparar entre commits.
+
+Ejecutar desde la raíz del proyecto:
+    python benchmarks/benchmark.py --tamaño 5000
+    python benchmarks/benchmark.py --solo lexico inferencia --comparar benchmarks/resultados/anterior.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# La caché de resultados falsearía las medidas de inferencia; se desactiva antes de importar el motor
+os.environ.setdefault("SENTIMENT_CACHE_MAX", "0")
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / "data"
+RESULTADOS_DIR = Path(__file__).resolve().parent / "resultados"
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(BASE_DIR / "backend"))
+sys.path.insert(0, str(BASE_DIR / "scripts"))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+BENCHMARKS = ("lexico", "entrenamiento", "carga", "arranque", "datos", "inferencia", "api")
+
+
+def generar_corpus(n, semilla=42):
+    """
+    Corpus sintético de n reseñas: reseñas reales y plantillas neutras/negativas, a las que a
+    veces se añade una frase del léxico de frases para ejercitar el trie.
+    """
+    import generar_resenas_negativas_neutras as plantillas
+
+    rng = random.Random(semilla)
+    reales = pd.read_csv(DATA_DIR / "barcelona_solo_espanol.csv")["comments"].dropna().astype(str).tolist()
+    frases = pd.read_csv(DATA_DIR / "frases_sentimiento.csv")["Frase"].astype(str).tolist()
+    base = reales + plantillas.RESENAS_NEUTRAS + plantillas.RESENAS_NEGATIVAS
+    corpus = []
+    for _ in range(n):
+        texto = rng.choice(base)
+        if rng.random() < 0.3:
+            texto = f"{texto} {rng.choice(frases).capitalize()}."
+        corpus.append(texto)
+    return corpus
+
+
+def guardar_corpus_csv(corpus, path, semilla=42):
+    rng = random.Random(semilla)
+    pd.DataFrame({
+        "listing_id": [rng.choice([18674, 23197, 32711, 703984]) for _ in corpus],
+        "id": range(1, len(corpus) + 1),
+        "date": "2024-01-01",
+        "reviewer_id": range(1, len(corpus) + 1),
+        "reviewer_name": "Bench",
+        "comments": corpus,
+    }).to_csv(path, index=False)
+
+
+def cronometrar(funcion, repeticiones=1):
+    """Mejor tiempo (s) de `repeticiones` ejecuciones."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def percentiles(muestras_s):
+    ms = np.asarray(muestras_s) * 1000
+    return {
+        "n": int(len(ms)),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def ejecutar_midiendo(codigo, cwd=BASE_DIR):
+    """
+    Ejecuta `codigo` en un intérprete nuevo y devuelve (segundos, pico de RSS en MB, salida).
+    El propio proceso hijo mide su pico de memoria al terminar.
+    """
+    # En Linux se lee VmHWM: ru_maxrss conserva tras exec el RSS del padre en el momento del fork
+    envoltorio = (
+        "import resource, sys, time\n"
+        "_t0 = time.perf_counter()\n"
+        f"exec(compile({codigo!r}, '<benchmark>', 'exec'))\n"
+        "_dt = time.perf_counter() - _t0\n"
+        "try:\n"
+        "    _kb = [int(l.split()[1]) for l in open('/proc/self/status') if l.startswith('VmHWM:')][0]\n"
+        "    _mb = _kb / 1024\n"
+        "except (OSError, IndexError):\n"
+        "    _rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+        "    _mb = _rss / 1024 / 1024 if sys.platform == 'darwin' else _rss / 1024\n"
+        "print(f'__BENCH__ {_dt} {_mb}')\n"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", envoltorio],
+        cwd=cwd, capture_output=True, text=True, check=True,
+    )
+    linea = [l for l in proc.stdout.splitlines() if l.startswith("__BENCH__ ")][-1]
+    _, segundos, mb = linea.split()
+    return float(segundos), float(mb), proc.stdout
+
+
+def bench_lexico(corpus, repeticiones):
+    import train_model
+
+    lexico = train_model.cargar_lexico()
+    por_texto = cronometrar(lambda: [train_model.etiquetar_con_lexico(t, lexico) for t in corpus], repeticiones)
+    en_bloque = cronometrar(lambda: lexico.etiquetar_many(corpus), repeticiones)
+    return {
+        "textos": len(corpus),
+        "por_texto_s": round(por_texto, 4),
+        "por_texto_textos_s": round(len(corpus) / por_texto, 1),
+        "bloque_s": round(en_bloque, 4),
+        "bloque_textos_s": round(len(corpus) / en_bloque, 1),
+    }
+
+
+def bench_entrenamiento(corpus, semilla):
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "corpus.csv"
+        guardar_corpus_csv(corpus, csv_path, semilla)
+        modelo_dir = Path(tmp) / "modelo"
+        codigo = (
+            "import train_model\n"
+            f"train_model.main(['--datos', {str(csv_path)!r}, '--modelo-dir', {str(modelo_dir)!r}])\n"
+        )
+        segundos, rss_mb, _ = ejecutar_midiendo(codigo)
+        return {"filas": len(corpus), "tiempo_s": round(segundos, 3), "pico_rss_mb": round(rss_mb, 1)}
+
+
+def bench_carga():
+    joblib_path = str(BASE_DIR / "model" / "sentiment_pipeline.joblib")
+    compacto_dir = str(BASE_DIR / "model" / "sentiment_compacto")
+    resultados = {}
+    casos = {
+        "joblib": f"import joblib\njoblib.load({joblib_path!r})\n",
+        "compacto": (
+            "import sys\nsys.path.insert(0, 'backend')\n"
+            "from modelo_compacto import PredictorCompacto\n"
+            f"PredictorCompacto.cargar({compacto_dir!r})\n"
+        ),
+        "motor_primera_valoracion": (
+            "import sys\nsys.path.insert(0, 'backend')\n"
+            "from sentiment_engine import valorar_reseña\nvalorar_reseña('Todo perfecto')\n"
+        ),
+    }
+    for nombre, codigo in casos.items():
+        if nombre == "compacto" and not Path(compacto_dir).exists():
+            continue
+        segundos, rss_mb, _ = ejecutar_midiendo(codigo)
+        resultados[nombre] = {"tiempo_s": round(segundos, 4), "pico_rss_mb": round(rss_mb, 1)}
+    return resultados
+
+
+def bench_arranque():
+    """Cada caso en un intérprete nuevo; `primera_peticion_s` es solo la latencia de esa petición."""
+    comun = (
+        "import os, sys, time\nsys.path.insert(0, 'backend')\n"
+        "os.environ['SENTIMENT_PRECALENTAR'] = '{precalentar}'\n"
+        "import main\n"
+        "print('__MODULOS__', *[m for m in ('pandas', 'joblib', 'sklearn') if m in sys.modules])\n"
+    )
+    cliente = (
+        "from fastapi.testclient import TestClient\n"
+        "with TestClient(main.app) as c:\n"
+        "    while c.get('/api/health/ready').status_code != 200:\n"
+        "        time.sleep(0.005)\n"
+        "    {peticion}\n"
+    )
+    valorar = (
+        "_t = time.perf_counter(); c.post('/api/valorar', json={'texto': 'Todo perfecto'}); "
+        "print('__PRIMERA__', time.perf_counter() - _t)"
+    )
+    casos = {
+        "import_main": comun.format(precalentar="1"),
+        "hasta_listo": comun.format(precalentar="1") + cliente.format(peticion="pass"),
+        "primera_valoracion_precalentada": comun.format(precalentar="1") + cliente.format(peticion=valorar),
+        "primera_valoracion_diferida": comun.format(precalentar="0") + cliente.format(peticion=valorar),
+    }
+    resultados = {}
+    for nombre, codigo in casos.items():
+        segundos, rss_mb, salida = ejecutar_midiendo(codigo)
+        resultado = {"tiempo_s": round(segundos, 4), "pico_rss_mb": round(rss_mb, 1)}
+        for linea in salida.splitlines():
+            if linea.startswith("__MODULOS__"):
+                resultado["modulos_pesados"] = linea.split()[1:]
+            elif linea.startswith("__PRIMERA__"):
+                resultado["primera_peticion_s"] = round(float(linea.split()[1]), 4)
+        resultados[nombre] = resultado
+    return resultados
+
+
+def bench_datos(corpus, semilla):
+    from datos_columnares import convertir_csv
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "corpus.csv"
+        guardar_corpus_csv(corpus, csv_path, semilla)
+        parquet_path, _ = convertir_csv(csv_path)
+        casos = {
+            "csv_completo": f"import pandas as pd\npd.read_csv({str(csv_path)!r})\n",
+            "csv_comments": (
+                "import sys\nsys.path.insert(0, 'backend')\nfrom datos_columnares import leer_tabla\n"
+                f"leer_tabla({str(csv_path)!r}, ['comments'])\n"
+            ),
+            "parquet_comments": (
+                "import sys\nsys.path.insert(0, 'backend')\nfrom datos_columnares import leer_tabla\n"
+                f"leer_tabla({str(parquet_path)!r}, ['comments'])\n"
+            ),
+        }
+        resultados = {"filas": len(corpus), "mb_csv": round(csv_path.stat().st_size / 1e6, 2),
+                      "mb_parquet": round(parquet_path.stat().st_size / 1e6, 2)}
+        for nombre, codigo in casos.items():
+            segundos, rss_mb, _ = ejecutar_midiendo(codigo)
+            resultados[nombre] = {"tiempo_s": round(segundos, 4), "pico_rss_mb": round(rss_mb, 1)}
+        return resultados
+
+
+def bench_inferencia(corpus, repeticiones, tamaño_lote=256):
+    import sentiment_engine
+
+    sentiment_engine.get_pipeline()
+    muestra = corpus[: min(len(corpus), 2000)]
+    texto_a_texto = cronometrar(lambda: [sentiment_engine.valorar_reseña(t) for t in muestra], repeticiones)
+    en_lote = cronometrar(
+        lambda: [
+            sentiment_engine.valorar_reseñas(muestra[i : i + tamaño_lote])
+            for i in range(0, len(muestra), tamaño_lote)
+        ],
+        repeticiones,
+    )
+    resultados = {
+        "textos": len(muestra),
+        "modelo": type(sentiment_engine.get_pipeline()).__name__,
+        "texto_a_texto_s": round(texto_a_texto, 4),
+        "texto_a_texto_ms_por_texto": round(texto_a_texto / len(muestra) * 1000, 4),
+        "lote_tamaño": tamaño_lote,
+        "lote_s": round(en_lote, 4),
+        "lote_ms_por_texto": round(en_lote / len(muestra) * 1000, 4),
+        "aceleracion": round(texto_a_texto / en_lote, 2),
+    }
+    resultados["una_reseña_us"] = bench_una_reseña(muestra[:200])
+    return resultados
+
+
+def bench_una_reseña(textos):
+    """Microsegundos por predict_proba([texto]) sin caché: Pipeline de sklearn frente a PredictorCompacto."""
+    import joblib
+    from modelo_compacto import PredictorCompacto, es_exportable
+
+    model_path = BASE_DIR / "model" / "sentiment_pipeline.joblib"
+    if not model_path.exists():
+        return {}
+    pipeline = joblib.load(model_path)
+    casos = {"sklearn_pipeline": pipeline}
+    if es_exportable(pipeline):
+        casos["predictor_compacto"] = PredictorCompacto.desde_pipeline(pipeline)
+    resultados = {}
+    for nombre, modelo in casos.items():
+        segundos = cronometrar(lambda: [modelo.predict_proba([t]) for t in textos], 3)
+        resultados[nombre] = round(segundos / len(textos) * 1e6, 1)
+    if len(resultados) == 2:
+        resultados["aceleracion"] = round(resultados["sklearn_pipeline"] / resultados["predictor_compacto"], 1)
+    return resultados
+
+
+def bench_api(corpus, semilla, peticiones=300):
+    """
+    La API sobre el corpus sintético: main se importa apuntando a un CSV y un almacén SQLite
+    temporales, así que no depende del estado de data/ ni lo modifica.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "corpus.csv"
+        guardar_corpus_csv(corpus, csv_path, semilla)
+        os.environ["SENTIMENT_DATOS"] = str(csv_path)
+        os.environ["SENTIMENT_ALMACEN"] = str(Path(tmp) / "resenas.sqlite")
+        import main
+
+        return _medir_api(main.app, corpus, peticiones)
+
+
+def _medir_api(app, corpus, peticiones):
+    from fastapi.testclient import TestClient
+
+    resultados = {}
+    with TestClient(app) as cliente:
+        cliente.get("/api/resenas?limite=1")  # importa y valora el corpus en el almacén temporal
+
+        def medir(nombre, llamada):
+            muestras = []
+            for i in range(peticiones):
+                inicio = time.perf_counter()
+                respuesta = llamada(i)
+                muestras.append(time.perf_counter() - inicio)
+                respuesta.raise_for_status()
+            resultados[nombre] = percentiles(muestras)
+
+        medir("valorar", lambda i: cliente.post("/api/valorar", json={"texto": corpus[i % len(corpus)]}))
+        medir(
+            "valorar_lote_100",
+            lambda i: cliente.post("/api/valorar/lote", json={"textos": corpus[:100]}),
+        )
+        medir("resenas_200", lambda i: cliente.get(f"/api/resenas?limite=200&offset={i % 5 * 200}"))
+        medir("health", lambda i: cliente.get("/api/health"))
+    return resultados
+
+
+def version_git():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actual, anterior_path):
+    """Imprime la variación de cada métrica numérica respecto a un JSON anterior."""
+    with open(anterior_path, encoding="utf-8") as f:
+        anterior = json.load(f)
+
+    def aplanar(d, prefijo=""):
+        for k, v in d.items():
+            if isinstance(v, dict):
+                yield from aplanar(v, f"{prefijo}{k}.")
+            elif isinstance(v, (int, float)) and not isinstance(v, bool):
+                yield f"{prefijo}{k}", v
+
+    previos = dict(aplanar(anterior.get("resultados", {})))
+    print(f"\nComparación con {anterior_path} (commit {anterior.get('commit')}):")
+    for clave, valor in aplanar(actual["resultados"]):
+        if clave in previos and previos[clave]:
+            cambio = (valor - previos[clave]) / previos[clave] * 100
+            print(f"  {clave:55s} {previos[clave]:>12} -> {valor:>12} ({cambio:+.1f}%)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de rendimiento del modelo de sentimiento.")
+    parser.add_argument("--tamaño", type=int, default=5000, help="Reseñas del corpus sintético.")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--repeticiones", type=int, default=3, help="Se toma el mejor tiempo.")
+    parser.add_argument("--solo", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--salida", type=Path, default=None, help="JSON de resultados.")
+    parser.add_argument("--comparar", type=Path, default=None, help="JSON anterior con el que comparar.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    corpus = generar_corpus(args.tamaño, args.semilla)
+    resultados = {}
+    for nombre in args.solo:
+        print(f"Benchmark: {nombre}...")
+        if nombre == "lexico":
+            resultados[nombre] = bench_lexico(corpus, args.repeticiones)
+        elif nombre == "entrenamiento":
+            resultados[nombre] = bench_entrenamiento(corpus, args.semilla)
+        elif nombre == "carga":
+            resultados[nombre] = bench_carga()
+        elif nombre == "arranque":
+            resultados[nombre] = bench_arranque()
+        elif nombre == "datos":
+            resultados[nombre] = bench_datos(corpus, args.semilla)
+        elif nombre == "inferencia":
+            resultados[nombre] = bench_inferencia(corpus, args.repeticiones)
+        elif nombre == "api":
+            resultados[nombre] = bench_api(corpus, args.semilla)
+        print(json.dumps(resultados[nombre], ensure_ascii=False, indent=2))
+
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": version_git(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "tamaño_corpus": args.tamaño,
+        "semilla": args.semilla,
+        "resultados": resultados,
+    }
+    salida = args.salida or RESULTADOS_DIR / f"{datetime.now():%Y%m%d_%H%M%S}_{informe['commit'] or 'local'}.json"
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados guardados en {salida}")
+    if args.comparar:
+        comparar(informe, args.comparar)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Convierte los CSV de reseñas a Parquet (una vez; se puede repetir cuando cambie el CSV).
+El Parquet se escribe junto al CSV con el mismo nombre y lo usan train_model.py y la API
+mientras no sea más antiguo que el CSV.
+
+Ejecutar desde la raíz del proyecto:
+    python scripts/convertir_a_parquet.py                       # data/barcelona_solo_espanol.csv
+    python scripts/convertir_a_parquet.py data/otra_ciudad.csv --salida data/otra_ciudad.parquet
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CSV_PATH = BASE_DIR / "data" / "barcelona_solo_espanol.csv"
+
+sys.path.insert(0, str(BASE_DIR / "backend"))
+from datos_columnares import FILAS_POR_GRUPO, convertir_csv  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convierte CSV de reseñas a Parquet.")
+    parser.add_argument("csv", type=Path, nargs="*", default=[CSV_PATH], help="CSV a convertir.")
+    parser.add_argument("--salida", type=Path, default=None, help="Ruta del Parquet (solo con un CSV).")
+    parser.add_argument("--filas-por-grupo", type=int, default=FILAS_POR_GRUPO, help="Filas por row group.")
+    args = parser.parse_args(argv)
+    if args.salida and len(args.csv) > 1:
+        parser.error("--salida solo se puede usar con un único CSV")
+
+    for csv_path in args.csv:
+        if not csv_path.exists():
+            print(f"No se encontró {csv_path}")
+            continue
+        inicio = time.perf_counter()
+        destino, filas = convertir_csv(csv_path, args.salida, args.filas_por_grupo)
+        mb_csv = csv_path.stat().st_size / 1e6
+        mb_parquet = destino.stat().st_size / 1e6
+        print(
+            f"{csv_path} → {destino}: {filas} filas, {mb_csv:.1f} MB → {mb_parquet:.1f} MB "
+            f"({time.perf_counter() - inicio:.2f} s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,54 @@
 """
-Genera reseñas neutras y negativas en español y las añade a data/barcelona_solo_espanol.csv
-para equilibrar el conjunto de datos (hay muchas positivas y pocas negativas).
+Genera reseñas sintéticas neutras y negativas en español para equilibrar las clases del corpus
+(hay muchas positivas y pocas negativas/neutras) y las escribe directamente en el almacén SQLite
+(data/resenas.sqlite), donde se valoran una sola vez al guardarlas.
 
-Ejecutar desde la raíz del proyecto: python scripts/generar_resenas_negativas_neutras.py
+- Cuántas: las que faltan para que cada clase llegue a `--proporcion` veces la mayoritaria, según
+  la etiqueta de léxico actual de las reseñas del almacén (la misma con la que se entrena).
+- Cómo: plantillas con huecos (aspecto del alojamiento, verbo, adjetivo concordado, aperturas y
+  cierres) y reseñas base, con sustitución de palabras del léxico (data/diccionario_extenso.csv)
+  por otras de la misma polaridad y terminación. Solo se conservan las que el léxico etiqueta
+  con la clase buscada.
+- En paralelo: se generan en bloques de `--bloque` reseñas repartidos entre `--procesos` procesos
+  mientras el proceso principal valora y escribe los anteriores. Cada bloque tiene su propia
+  semilla (semilla, clase, posición) y los ids se derivan de ella: con la misma semilla y el mismo
+  almacén sale lo mismo con cualquier número de procesos, y repetirlo no duplica reseñas.
+
+Ejecutar desde la raíz del proyecto:
+    python scripts/generar_resenas_negativas_neutras.py                 # hasta el 50 % de la mayoritaria
+    python scripts/generar_resenas_negativas_neutras.py --proporcion 1 --procesos -1 --semilla 7
+    python scripts/generar_resenas_negativas_neutras.py --csv           # además, al final del CSV
 """
+import argparse
+import contextlib
 import csv
+import hashlib
+import math
 import random
-from pathlib import Path
+import sys
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 CSV_PATH = DATA_DIR / "barcelona_solo_espanol.csv"
-BACKUP_PATH = DATA_DIR / "barcelona_solo_espanol.backup.csv"
+
+sys.path.insert(0, str(BASE_DIR / "backend"))
+from lexico import TOKEN_RE, Lexico  # noqa: E402
+from pool_valoracion import procesos_configurados  # noqa: E402
+
+PROPORCION = 0.5
+TAMAÑO_BLOQUE = 5000
+SEMILLA = 42
+CLASES_GENERADAS = ("Neutro", "Negativo")
+# Probabilidad de partir de una reseña base en vez de una plantilla, y de sustituir cada palabra polar
+PROB_BASE = 0.3
+PROB_SUSTITUCION = 0.5
+# Candidatas por reseña pedida antes de dar un bloque por terminado con menos filas
+MAX_INTENTOS = 20
 
 # listing_id que ya aparecen en el CSV (Barcelona)
 LISTING_IDS = [703984, 1354875, 18674, 23197, 32711, 715036, 147275, 729078, 1411945]
@@ -130,86 +166,332 @@ RESENAS_NEGATIVAS = [
     "No repetiría. Barrio feo, piso anticuado. La cama incómoda. Mala experiencia.",
 ]
 
-def generar_id_unico(existentes):
-    """Genera un ID numérico grande que no esté en la lista."""
-    while True:
-        id_val = random.randint(400000000000000000, 999999999999999999)
-        if id_val not in existentes:
-            return id_val
+RESENAS_BASE = {"Neutro": RESENAS_NEUTRAS, "Negativo": RESENAS_NEGATIVAS}
+
+# Aspectos con su género y número, para concordar verbo y adjetivo
+ASPECTOS = [
+    ("el piso", "m", False), ("el apartamento", "m", False), ("la habitación", "f", False),
+    ("el baño", "m", False), ("la cocina", "f", False), ("la cama", "f", False), ("la ducha", "f", False),
+    ("el barrio", "m", False), ("la zona", "f", False), ("la terraza", "f", False),
+    ("el edificio", "m", False), ("las camas", "f", True), ("las toallas", "f", True),
+    ("las ventanas", "f", True), ("los baños", "m", True),
+]
+VERBOS = {False: ("es", "era", "estaba", "nos pareció"), True: ("son", "eran", "estaban", "nos parecieron")}
+# Adjetivos en masculino singular: se flexionan según el aspecto y su polaridad se lee del léxico
+ADJETIVOS = {
+    "Negativo": [
+        "sucio", "descuidado", "viejo", "oscuro", "roto", "incómodo", "pequeño", "ruidoso", "horrible",
+        "desagradable", "deficiente", "caro", "estrecho", "mugriento", "lamentable", "penoso", "frío",
+        "asqueroso",
+    ],
+    "Positivo": [
+        "limpio", "cómodo", "moderno", "amplio", "luminoso", "tranquilo", "agradable", "acogedor", "bueno",
+        "silencioso", "espacioso", "reformado", "equipado", "céntrico", "perfecto", "precioso",
+    ],
+    "Neutro": ["normal", "aceptable", "correcto", "sencillo", "básico", "funcional"],
+}
+INTENSIFICADORES = ("", "", "muy ", "bastante ", "algo ")
+CONECTORES = ("pero", "aunque", "en cambio", "si bien")
+APERTURAS = {
+    "Negativo": (
+        "", "Mala experiencia.", "Decepcionante.", "No lo recomiendo.", "Muy decepcionados con la estancia.",
+        "Una estancia para olvidar.",
+    ),
+    "Neutro": ("", "Estancia normal.", "Todo correcto en general.", "Experiencia aceptable.", "Sin más."),
+}
+CIERRES = {
+    "Negativo": ("", "No volvería.", "No repetiría.", "No vale lo que cuesta.", "Una pena."),
+    "Neutro": ("", "Para unos días sirve.", "Nada que destacar.", "Cumple su función.", "Lo esperado para el precio."),
+}
+
+
+def flexionar(adjetivo, genero, plural):
+    """Concuerda un adjetivo en masculino singular con el género y el número del aspecto."""
+    if genero == "f" and adjetivo.endswith("o"):
+        adjetivo = adjetivo[:-1] + "a"
+    elif genero == "f" and adjetivo.endswith("or"):
+        adjetivo += "a"
+    if plural:
+        adjetivo += "s" if adjetivo[-1] in "aeiouáéíóú" else "es"
+    return adjetivo
+
+
+def _terminacion(palabra):
+    """Terminación que aproxima género y número (sucio/sucia/sucios): se sustituye dentro del grupo."""
+    if palabra.endswith("mente"):
+        return "mente"
+    return palabra[-2:] if palabra.endswith("s") else palabra[-1:]
+
+
+def _oracion(frase):
+    return frase[0].upper() + frase[1:] + "."
+
+
+class GeneradorResenas:
+    """
+    Compone reseñas de una clase y se queda con las que el léxico etiqueta con esa clase. Las
+    palabras polares pueden cambiarse por otras del diccionario con la misma polaridad y
+    terminación (sucio → mugriento, pésima → horrorosa): la puntuación no cambia y la
+    concordancia casi nunca se rompe.
+    """
+
+    def __init__(self, lexico, prob_base=PROB_BASE, prob_sustitucion=PROB_SUSTITUCION):
+        self.lexico = lexico
+        self.prob_base = prob_base
+        self.prob_sustitucion = prob_sustitucion
+        # Las palabras de las frases (no recomiendo, no volvería) se dejan tal cual
+        self.fijas = set(lexico.frases.palabras())
+        grupos = defaultdict(list)
+        for palabra, valor in lexico.palabras.items():
+            if valor and palabra.isalpha() and palabra not in self.fijas:
+                grupos[(valor, _terminacion(palabra))].append(palabra)
+        sustitutos = {clave: sorted(palabras) for clave, palabras in grupos.items() if len(palabras) > 1}
+        # Palabra → sus posibles sustitutas (incluida ella misma)
+        self.sustitutos = {
+            palabra: sustitutos[(valor, _terminacion(palabra))]
+            for palabra, valor in lexico.palabras.items()
+            if (valor, _terminacion(palabra)) in sustitutos and palabra not in self.fijas
+        }
+        # Formas flexionadas por (clase, género, plural) con su polaridad en el léxico
+        self.adjetivos = {
+            (clase, genero, plural): [
+                (forma, lexico.palabras.get(forma, 0)) for forma in (flexionar(a, genero, plural) for a in adjetivos)
+            ]
+            for clase, adjetivos in ADJETIVOS.items()
+            for genero in "mf"
+            for plural in (False, True)
+        }
+
+    def _frase(self, rng, clase):
+        aspecto, genero, plural = rng.choice(ASPECTOS)
+        adjetivo, _ = rng.choice(self.adjetivos[(clase, genero, plural)])
+        return f"{aspecto} {rng.choice(VERBOS[plural])} {rng.choice(INTENSIFICADORES)}{adjetivo}"
+
+    def _contraste(self, rng):
+        """Un aspecto positivo y otro negativo de la misma intensidad: en el léxico suman 0."""
+        aspecto, genero, plural = rng.choice(ASPECTOS)
+        positivo, valor = rng.choice(self.adjetivos[("Positivo", genero, plural)])
+        otro, genero2, plural2 = rng.choice([a for a in ASPECTOS if a[0] != aspecto])
+        formas = self.adjetivos[("Negativo", genero2, plural2)]
+        negativo = rng.choice([f for f, v in formas if v == -valor] or [f for f, _ in formas])
+        return (
+            f"{aspecto} {rng.choice(VERBOS[plural])} {positivo}, {rng.choice(CONECTORES)} "
+            f"{otro} {rng.choice(VERBOS[plural2])} {negativo}"
+        )
+
+    def componer(self, rng, clase):
+        """Una reseña candidata de la clase (aún sin comprobar su etiqueta)."""
+        if rng.random() < self.prob_base:
+            texto = rng.choice(RESENAS_BASE[clase])
+        else:
+            if clase == "Neutro":
+                frases = [self._contraste(rng)] + [self._frase(rng, "Neutro") for _ in range(rng.randint(0, 1))]
+            else:
+                frases = [self._frase(rng, clase) for _ in range(rng.randint(1, 3))]
+            rng.shuffle(frases)
+            partes = [rng.choice(APERTURAS[clase]), *map(_oracion, frases), rng.choice(CIERRES[clase])]
+            texto = " ".join(p for p in partes if p)
+        return self.sustituir(rng, texto)
+
+    def sustituir(self, rng, texto):
+        """Cambia palabras polares por otras del léxico con la misma polaridad y terminación."""
+
+        def cambiar(m):
+            palabra = m.group()
+            grupo = self.sustitutos.get(palabra.lower())
+            if grupo is None or rng.random() >= self.prob_sustitucion:
+                return palabra
+            nueva = rng.choice(grupo)
+            return nueva.capitalize() if palabra[0].isupper() else nueva
+
+        return TOKEN_RE.sub(cambiar, texto)
+
+    def generar(self, rng, clase, n):
+        """n textos que el léxico etiqueta como `clase` (menos si se agotan los intentos)."""
+        textos, intentos = [], 0
+        while len(textos) < n and intentos < n * MAX_INTENTOS:
+            faltan = n - len(textos)
+            candidatos = [self.componer(rng, clase) for _ in range(faltan + faltan // 4 + 1)]
+            intentos += len(candidatos)
+            etiquetas = self.lexico.etiquetar_many(candidatos)
+            textos.extend(t for t, e in zip(candidatos, etiquetas) if e == clase)
+        return textos[:n]
+
+
+def id_sintetico(semilla, clase, posicion):
+    """Id numérico grande derivado de la semilla: repetir con la misma semilla no duplica reseñas."""
+    h = hashlib.blake2b(f"{semilla}:{clase}:{posicion}".encode(), digest_size=8).digest()
+    return 400000000000000000 + int.from_bytes(h, "big") % 600000000000000000
 
-def generar_fecha_aleatoria():
+
+def generar_fecha_aleatoria(rng=random):
     """Fecha entre 2019 y 2025."""
     inicio = datetime(2019, 1, 1)
     fin = datetime(2025, 2, 1)
     delta = (fin - inicio).days
-    d = inicio + timedelta(days=random.randint(0, delta))
+    d = inicio + timedelta(days=rng.randint(0, delta))
     return d.strftime("%Y-%m-%d")
 
-def main():
-    if not CSV_PATH.exists():
-        print(f"No se encontró {CSV_PATH}")
+
+_generador = None
+
+
+def _init_worker(generador):
+    global _generador
+    _generador = generador
+
+
+def generar_bloque(bloque):
+    """Filas (columnas del CSV) de un bloque (semilla, clase, posición inicial, n)."""
+    semilla, clase, inicio, n = bloque
+    rng = random.Random(f"{semilla}:{clase}:{inicio}")
+    return [
+        {
+            "listing_id": rng.choice(LISTING_IDS),
+            "id": id_sintetico(semilla, clase, inicio + i),
+            "date": generar_fecha_aleatoria(rng),
+            "reviewer_id": rng.randint(1000000, 999999999),
+            "reviewer_name": rng.choice(NOMBRES),
+            "comments": texto,
+        }
+        for i, texto in enumerate(_generador.generar(rng, clase, n))
+    ]
+
+
+def plan_generacion(distribucion, proporcion=PROPORCION, limite=None):
+    """Reseñas a generar por clase para que cada una llegue a `proporcion` veces la mayoritaria."""
+    objetivo = math.ceil(proporcion * max(distribucion.values(), default=0))
+    plan = {}
+    for clase in CLASES_GENERADAS:
+        n = max(0, objetivo - distribucion.get(clase, 0))
+        plan[clase] = n if limite is None else min(n, limite)
+    return plan
+
+
+def bloques_de(plan, distribucion, semilla, tamaño=TAMAÑO_BLOQUE):
+    """
+    Bloques (semilla, clase, posición, n). Las posiciones siguen al número actual de reseñas de
+    la clase, así que una segunda pasada con otra proporción genera reseñas e ids nuevos.
+    """
+    for clase, n in plan.items():
+        inicio = distribucion.get(clase, 0)
+        for k in range(0, n, tamaño):
+            yield semilla, clase, inicio + k, min(tamaño, n - k)
+
+
+def _en_orden(funcion, items, ejecutor=None, ventana=2):
+    """(item, funcion(item)) en orden; con ejecutor, como mucho `ventana` bloques pendientes en memoria."""
+    if ejecutor is None:
+        for item in items:
+            yield item, funcion(item)
         return
+    pendientes = deque()
+    for item in items:
+        pendientes.append((item, ejecutor.submit(funcion, item)))
+        if len(pendientes) >= ventana:
+            item, futuro = pendientes.popleft()
+            yield item, futuro.result()
+    while pendientes:
+        item, futuro = pendientes.popleft()
+        yield item, futuro.result()
+
+
+def añadir_al_csv(path, filas):
+    """Añade filas al final del CSV con sus mismas columnas, sin leer ni reescribir el resto."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        fieldnames = next(csv.reader(f))
+    with open(path, "rb") as f:
+        falta_salto = False
+        if f.seek(0, 2) > 0:
+            f.seek(-1, 2)
+            falta_salto = f.read(1) != b"\n"
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        if falta_salto:
+            f.write("\n")
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore", lineterminator="\n")
+        writer.writerows(filas)
+
+
+def parse_args(argv=None):
+    from almacen_resenas import ALMACEN_PATH
+
+    parser = argparse.ArgumentParser(description="Genera reseñas neutras y negativas para equilibrar las clases.")
+    parser.add_argument(
+        "--proporcion", type=float, default=PROPORCION,
+        help="Cada clase generada llega a esta fracción de la mayoritaria (1 = todas iguales).",
+    )
+    parser.add_argument("--limite", type=int, default=None, help="Máximo de reseñas nuevas por clase.")
+    parser.add_argument("--semilla", type=int, default=SEMILLA, help="Semilla (mismo resultado con la misma).")
+    parser.add_argument(
+        "--procesos", type=int, default=None,
+        help="Procesos para generar y valorar (-1 = todos los núcleos; por defecto SENTIMENT_PROCESOS).",
+    )
+    parser.add_argument("--bloque", type=int, default=TAMAÑO_BLOQUE, help="Reseñas por bloque.")
+    parser.add_argument("--datos", type=Path, default=CSV_PATH, help="Corpus que se sincroniza con el almacén.")
+    parser.add_argument("--almacen", type=Path, default=ALMACEN_PATH, help="Almacén SQLite de reseñas.")
+    parser.add_argument("--csv", action="store_true", help="Añadir también las reseñas al final de --datos (CSV).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from almacen_resenas import AlmacenResenas
+    from sentiment_engine import cerrar_pool, iniciar_pool
+
+    if args.csv and args.datos.suffix.lower() != ".csv":
+        print(f"--csv necesita un corpus CSV ({args.datos})")
+        return
+    inicio = time.perf_counter()
+    almacen = AlmacenResenas(args.almacen)
+    generador = GeneradorResenas(Lexico.desde_csv())
+    n_procesos = procesos_configurados(args.procesos)
+
+    # Los workers de generación se crean antes de cargar el modelo (no lo necesitan); los de
+    # valoración, después, para compartirlo
+    paralelo = n_procesos > 1
+    with (
+        ProcessPoolExecutor(n_procesos, initializer=_init_worker, initargs=(generador,))
+        if paralelo
+        else contextlib.nullcontext()
+    ) as ejecutor:
+        if not paralelo:
+            _init_worker(generador)
+        iniciar_pool(n_procesos)
+        try:
+            if args.datos.exists():
+                # Con el corpus al día en el almacén, la distribución es la real
+                almacen.sincronizar(args.datos)
+            distribucion = almacen.distribucion_etiquetas()
+            plan = plan_generacion(distribucion, args.proporcion, args.limite)
+            print(f"Distribución actual: {distribucion}")
+            print(f"A generar (proporción {args.proporcion:g} de la mayoritaria): {plan}")
+
+            total = sum(plan.values())
+            generadas, insertadas = defaultdict(int), 0
+            for (_, clase, _, _), filas in _en_orden(
+                generar_bloque, bloques_de(plan, distribucion, args.semilla, args.bloque), ejecutor, 2 * n_procesos
+            ):
+                if not filas:
+                    continue
+                # Se valoran una vez al guardarlas; la sincronización con --csv solo lee lo añadido
+                insertadas += almacen.añadir(filas)
+                if args.csv:
+                    añadir_al_csv(args.datos, filas)
+                generadas[clase] += len(filas)
+                print(f"  {sum(generadas.values())}/{total} reseñas generadas")
+            if args.csv:
+                almacen.sincronizar(args.datos)
+        finally:
+            cerrar_pool()
+
+    segundos = time.perf_counter() - inicio
+    print(
+        f"Se han añadido {insertadas} reseñas al almacén {args.almacen} en {segundos:.1f} s "
+        f"(generadas por clase: {dict(generadas)})"
+    )
+    print(f"Distribución final: {almacen.distribucion_etiquetas()}")
+    print(f"Total de reseñas en el almacén: {len(almacen)}")
 
-    # Leer IDs existentes para no duplicar
-    ids_existentes = set()
-    with open(CSV_PATH, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            try:
-                ids_existentes.add(int(row["id"]))
-            except (ValueError, KeyError):
-                pass
-
-    # Preparar nuevas filas: mezcla de neutras y negativas (más negativas para equilibrar)
-    nuevas_filas = []
-    num_neutras = 40
-    num_negativas = 80
-
-    neutras = [(r, "Neutro") for r in random.sample(RESENAS_NEUTRAS, min(num_neutras, len(RESENAS_NEUTRAS)))]
-    negativas = [(r, "Negativo") for r in random.sample(RESENAS_NEGATIVAS, min(num_negativas, len(RESENAS_NEGATIVAS)))]
-    reseñas_a_usar = neutras + negativas
-    random.shuffle(reseñas_a_usar)
-
-    for comentario, _ in reseñas_a_usar:
-        rid = generar_id_unico(ids_existentes)
-        ids_existentes.add(rid)
-        reviewer_id = random.randint(1000000, 999999999)
-        listing_id = random.choice(LISTING_IDS)
-        date = generar_fecha_aleatoria()
-        name = random.choice(NOMBRES)
-        nuevas_filas.append({
-            "listing_id": listing_id,
-            "id": rid,
-            "date": date,
-            "reviewer_id": reviewer_id,
-            "reviewer_name": name,
-            "comments": comentario,
-        })
-
-    # Backup opcional
-    import shutil
-    shutil.copy(CSV_PATH, BACKUP_PATH)
-    print(f"Backup guardado en {BACKUP_PATH}")
-
-    # Leer todo el CSV actual
-    with open(CSV_PATH, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        fieldnames = reader.fieldnames
-        filas_actuales = list(reader)
-
-    # Añadir nuevas filas
-    filas_actuales.extend(nuevas_filas)
-
-    # Escribir CSV completo
-    with open(CSV_PATH, "w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(filas_actuales)
-
-    n_neutras = sum(1 for _, et in reseñas_a_usar if et == "Neutro")
-    n_negativas = len(nuevas_filas) - n_neutras
-    print(f"Se han añadido {len(nuevas_filas)} reseñas ({n_neutras} neutras, {n_negativas} negativas) a {CSV_PATH}")
-    print(f"Total de filas ahora: {len(filas_actuales)}")
 
 if __name__ == "__main__":
     main()
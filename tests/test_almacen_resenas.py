@@ -0,0 +1,92 @@
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import almacen_resenas  # noqa: E402
+from almacen_resenas import AlmacenResenas  # noqa: E402
+
+COMENTARIOS = [
+    "Genial, muy limpio y el anfitrión encantador",
+    "Horrible, sucio y ruidoso",
+    "Correcto, sin más",
+    "Ubicación perfecta, volveríamos sin duda",
+    "La cama era incómoda y no había agua caliente",
+]
+
+
+def _rollups(path):
+    con = sqlite3.connect(path)
+    try:
+        return {
+            tabla: sorted(
+                tuple(round(v, 6) if isinstance(v, float) else v for v in fila)
+                for fila in con.execute(f"SELECT * FROM {tabla}")
+            )
+            for tabla in ("rollup_listing", "rollup_listing_mes")
+        }
+    finally:
+        con.close()
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    almacen = AlmacenResenas(tmp_path / "resenas.sqlite")
+    almacen.añadir(
+        [
+            {
+                "listing_id": str(i % 3),
+                "id": str(i),
+                "date": f"2023-{i % 12 + 1:02d}-01",
+                "reviewer_id": "r",
+                "reviewer_name": "n",
+                "comments": COMENTARIOS[i % len(COMENTARIOS)],
+            }
+            for i in range(40)
+        ]
+    )
+    # Valoraciones de una versión anterior, distintas de las que dará el modelo actual
+    con = sqlite3.connect(almacen.path)
+    with con:
+        con.execute(
+            "UPDATE resenas SET estrellas = 3, puntuacion_media = 3.0, valoracion = 'Neutro',"
+            " version_valoracion = 'anterior'"
+        )
+        almacen._reconstruir_rollups(con)
+    con.close()
+    return almacen
+
+
+def test_revalorar_a_la_vez_mantiene_los_rollups(almacen, monkeypatch):
+    valorar = almacen_resenas.valorar_con_version
+    barrera = threading.Barrier(2, timeout=60)
+
+    def valorar_a_la_vez(textos):
+        # Los dos procesos valoran el mismo lote antes de que ninguno escriba
+        resultado = valorar(textos)
+        barrera.wait()
+        return resultado
+
+    monkeypatch.setattr(almacen_resenas, "valorar_con_version", valorar_a_la_vez)
+    otro = AlmacenResenas(almacen.path)
+    revaloradas = []
+    hilos = [
+        threading.Thread(target=lambda a=a: revaloradas.append(a.revalorar_obsoletas()))
+        for a in (almacen, otro)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert sum(revaloradas) == 40
+    mantenidos = _rollups(almacen.path)
+    con = sqlite3.connect(almacen.path)
+    with con:
+        almacen._reconstruir_rollups(con)
+    con.close()
+    assert mantenidos == _rollups(almacen.path)
@@ -0,0 +1,51 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture
+def main(tmp_path, monkeypatch):
+    # La API no debe tocar el corpus ni el almacén reales
+    monkeypatch.setenv("SENTIMENT_DATOS", str(tmp_path / "corpus.csv"))
+    monkeypatch.setenv("SENTIMENT_ALMACEN", str(tmp_path / "resenas.sqlite"))
+    import main
+
+    return main
+
+
+def _esperar_listo(cliente, limite=10):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if cliente.get("/api/health/ready").status_code == 200:
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_listo_tras_un_precalentamiento_fallido(main, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    intentos = []
+
+    def precalentar_falla_una_vez():
+        intentos.append(time.monotonic())
+        return len(intentos) > 1
+
+    monkeypatch.setattr(main, "precalentar", precalentar_falla_una_vez)
+    monkeypatch.setattr(main, "ESPERA_PRECALENTAR", 0.05)
+    with TestClient(main.app) as cliente:
+        assert _esperar_listo(cliente)
+        assert cliente.get("/api/health").json()["listo"] is True
+    assert len(intentos) == 2
+
+
+def test_sin_precalentar_listo_desde_el_arranque(main, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(main, "PRECALENTAR", False)
+    with TestClient(main.app) as cliente:
+        assert cliente.get("/api/health/ready").status_code == 200
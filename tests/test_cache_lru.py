@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from cache_lru import CacheLRU  # noqa: E402
+
+
+def test_resultado_de_version_anterior_no_se_guarda_ni_se_sirve():
+    cache = CacheLRU(10)
+    cache.asegurar_version("vieja")
+    cache.put("genial", {"puntuacion_media": 4.0}, "vieja")
+    # Se activa otro modelo mientras una valoración con el anterior sigue en curso
+    cache.asegurar_version("nueva")
+    cache.put("limpio", {"puntuacion_media": 4.01}, "vieja")
+    assert cache.get("genial", "nueva") is None
+    assert cache.get("limpio", "nueva") is None
+    assert len(cache) == 0
+
+    cache.put("limpio", {"puntuacion_media": 5.0}, "nueva")
+    assert cache.get("limpio", "nueva") == {"puntuacion_media": 5.0}
+    assert cache.get("limpio", "vieja") is None
+
+
+def test_expulsa_la_menos_usada():
+    cache = CacheLRU(2)
+    cache.asegurar_version("v")
+    for texto in ("a", "b"):
+        cache.put(texto, {"t": texto}, "v")
+    cache.get("a", "v")
+    cache.put("c", {"t": "c"}, "v")
+    assert cache.get("b", "v") is None
+    assert cache.get("a", "v") == {"t": "a"}
+    assert cache.estado()["evictions"] == 1
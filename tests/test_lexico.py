@@ -0,0 +1,88 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from lexico import MIN_LOTE_VECTORIZADO, Lexico  # noqa: E402
+
+PALABRAS = {"bien": 2, "limpio": 2, "genial": 3, "sucio": -2, "ruidoso": -1, "no": -1, "gusto": 1, "ubicado": 1}
+FRASES = {
+    ("no", "me", "gusto"): -2,
+    ("muy", "bien"): 1,
+    ("muy", "bien", "ubicado"): 3,
+    ("bien", "ubicado", "y", "limpio"): 3,
+    ("nada", "que", "decir"): 0,
+}
+RELLENO = ["el", "piso", "y", "me", "que", "decir", "muy", "nada", "estaba", "ǂ", "ǂǂ", "Genial", "MUY", "Bien"]
+
+
+@pytest.fixture(scope="module")
+def lexico():
+    return Lexico(PALABRAS, FRASES)
+
+
+def _textos(n, semilla=0):
+    rng = random.Random(semilla)
+    vocab = list(PALABRAS) + RELLENO
+    textos = [" ".join(rng.choices(vocab, k=rng.randint(0, 12))) for _ in range(n)]
+    textos += [
+        "",
+        "   ",
+        "estaba muy bien",  # frase al final del texto
+        "no me gusto",  # el texto entero es una frase
+        "muy bien ubicado y limpio",  # solapes: gana la más larga que empieza antes
+        "bien ubicado y limpio",
+        "muy",  # comienzo de frase al final, sin completar
+        "me gusto muy",
+        "limpioǂ genial",
+        "ǂǂǂ",  # la marca de separación dentro de un texto
+        "sucio ǂǂǂ genial",
+    ]
+    return textos
+
+
+def _igual_texto_a_texto(lexico, textos):
+    assert len(textos) >= MIN_LOTE_VECTORIZADO
+    assert lexico.score_many(textos).tolist() == [lexico.score(t) for t in textos]
+
+
+def test_lote_vectorizado_igual_que_texto_a_texto(lexico):
+    _igual_texto_a_texto(lexico, _textos(500))
+
+
+def test_lote_sin_marca_de_separacion(lexico):
+    # Sin "ǂǂǂ" en ningún texto el lote va por la vía vectorizada (con ella, texto a texto)
+    textos = [t for t in _textos(500, semilla=1) if "ǂǂǂ" not in t]
+    _igual_texto_a_texto(lexico, textos)
+
+
+def test_frase_no_cruza_el_limite_entre_textos(lexico):
+    textos = ["estaba muy", "bien ubicado"] * MIN_LOTE_VECTORIZADO
+    _igual_texto_a_texto(lexico, textos)
+    assert lexico.score_many(textos).tolist()[:2] == [0, 3]
+
+
+def test_varios_procesos(lexico):
+    textos = _textos(300, semilla=2)
+    try:
+        assert lexico.score_many(textos, n_jobs=2, chunksize=100).tolist() == [lexico.score(t) for t in textos]
+    finally:
+        lexico.cerrar_pool()
+
+
+def test_frase_de_cuatro_palabras(lexico):
+    # 3 por la frase, en lugar de bien + ubicado + limpio = 5 palabra a palabra
+    assert lexico.score("bien ubicado y limpio") == 3
+    assert lexico.frases.buscar("bien ubicado y limpio".split(), 0) == (4, 3)
+
+
+def test_gana_la_frase_mas_larga(lexico):
+    palabras = "muy bien ubicado".split()
+    assert lexico.frases.buscar(palabras, 0) == (3, 3)
+    assert lexico.frases.buscar(palabras[:2], 0) == (2, 1)
+    # No "muy bien" (1) + ubicado (1)
+    assert lexico.score("muy bien ubicado") == 3
+    assert lexico.score("muy bien") == 1
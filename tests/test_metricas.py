@@ -0,0 +1,50 @@
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from metricas import BUCKETS_TAMAÑO, Registro  # noqa: E402
+
+# Línea de muestra del formato de texto 0.0.4: nombre{etiqueta="valor",...} valor
+MUESTRA = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*"(,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*")*\})? \S+$')
+
+
+def _exponer():
+    registro = Registro()
+    registro.describir("peticiones_total", "Peticiones atendidas.")
+    registro.incrementar("peticiones_total", ruta="/api/valorar", codigo=200)
+    registro.incrementar("peticiones_total", 2, ruta="/api/valorar", codigo=200)
+    registro.incrementar("peticiones_total", ruta='/raro"\\', codigo=500)
+    registro.fijar("modelo_carga_segundos", 0.5)
+    for tamaño in (1, 3, 3, 5000):
+        registro.observar("lote_tamano", tamaño, buckets=BUCKETS_TAMAÑO)
+    return registro.exponer([("cache_entradas", 7)])
+
+
+def test_formato_de_exposicion():
+    lineas = _exponer().splitlines()
+    for linea in lineas:
+        assert linea.startswith("# ") or MUESTRA.match(linea), linea
+    assert "# HELP peticiones_total Peticiones atendidas." in lineas
+    assert "# TYPE peticiones_total counter" in lineas
+    assert 'peticiones_total{codigo="200",ruta="/api/valorar"} 3' in lineas
+    assert 'peticiones_total{codigo="500",ruta="/raro\\"\\\\"} 1' in lineas
+    assert "# TYPE modelo_carga_segundos gauge" in lineas
+    assert "cache_entradas 7" in lineas
+    # Un TYPE por métrica, antes de sus muestras
+    tipos = [l.split()[2] for l in lineas if l.startswith("# TYPE")]
+    assert len(tipos) == len(set(tipos))
+
+
+def test_histograma_acumulado():
+    lineas = _exponer().splitlines()
+    assert "# TYPE lote_tamano histogram" in lineas
+    buckets = [l for l in lineas if l.startswith("lote_tamano_bucket")]
+    conteos = [int(l.rsplit(" ", 1)[1]) for l in buckets]
+    assert conteos == sorted(conteos)
+    assert buckets[0] == 'lote_tamano_bucket{le="1"} 1'
+    assert 'lote_tamano_bucket{le="4"} 3' in buckets
+    assert buckets[-1] == 'lote_tamano_bucket{le="+Inf"} 4'
+    assert "lote_tamano_count 4" in lineas
+    assert "lote_tamano_sum 5007.0" in lineas
@@ -0,0 +1,51 @@
+import sys
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from modelo_compacto import MAX_TEXTOS_INDICE, PredictorCompacto  # noqa: E402
+
+TEXTOS = [
+    "El piso estaba muy limpio y la ubicación es genial",
+    "Horrible, sucio y ruidoso, no lo recomiendo",
+    "Correcto, sin más, la cama algo incómoda",
+    "Anfitrión encantador, volveríamos sin duda",
+]
+
+
+@pytest.fixture(scope="module")
+def modelos():
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+
+    pipeline = Pipeline(
+        [("tfidf", TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True)), ("clf", LogisticRegression())]
+    )
+    pipeline.fit(TEXTOS * 3, ["Positivo", "Negativo", "Neutro", "Positivo"] * 3)
+    return pipeline, PredictorCompacto.desde_pipeline(pipeline)
+
+
+def test_lote_igual_que_texto_a_texto(modelos):
+    pipeline, predictor = modelos
+    textos = [f"{TEXTOS[i % len(TEXTOS)]} {i}" for i in range(MAX_TEXTOS_INDICE * 3)] + ["", "zzz desconocido"]
+    lote = predictor.predict_proba(textos)
+    assert np.array_equal(lote, np.vstack([predictor.predict_proba([t]) for t in textos]))
+    assert np.allclose(lote, pipeline.predict_proba(textos), atol=1e-9)
+
+
+def test_termino_muy_largo_no_dispara_la_memoria(modelos):
+    _, predictor = modelos
+    textos = TEXTOS * 250 + ["genial " + "a" * 50_000]
+    tracemalloc.start()
+    try:
+        predictor.transform(textos)
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Con un array de cadenas de ancho fijo cada término ocuparía 200 KB (unos 2 GB en total)
+    assert pico < 50 * 2**20
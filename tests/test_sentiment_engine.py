@@ -0,0 +1,25 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from lexico import MIN_LOTE_VECTORIZADO  # noqa: E402
+from sentiment_engine import cache_resultados, valorar_reseña, valorar_reseñas  # noqa: E402
+
+TEXTOS = [
+    "El piso estaba muy limpio y la ubicación es genial, volveríamos sin duda",
+    "Horrible. Sucio, ruidoso y el anfitrión no contestaba. NO lo recomiendo",
+    "Correcto, sin más",
+    "No está mal, aunque la cama era algo incómoda",
+    "",
+    "   ",
+    "!!!",
+]
+
+
+def test_lote_igual_que_una_a_una(monkeypatch):
+    # Sin caché: cada resultado sale del modelo, en lote o de uno en uno
+    monkeypatch.setattr(cache_resultados, "max_entradas", 0)
+    cache_resultados._datos.clear()
+    lote = [f"{TEXTOS[i % len(TEXTOS)]} {i % 5}" for i in range(MIN_LOTE_VECTORIZADO * 3)] + TEXTOS
+    assert valorar_reseñas(lote) == [valorar_reseña(t) for t in lote]
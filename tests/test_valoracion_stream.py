@@ -0,0 +1,79 @@
+import asyncio
+import csv
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import valoracion_stream  # noqa: E402
+from valoracion_stream import valorar_lineas, valorar_stream  # noqa: E402
+
+FILAS = [
+    ["id", "comments", "listing_id"],
+    ["1", "Muy limpio", "10"],
+    ["2", 'Dijo "genial"\ny volvería,\nsin duda', "10"],
+    ["3", "Línea\r\ncon CRLF y acentos: ñandú", "11"],
+    ["4", '""', "11"],
+    ["5", 'Comillas al final ""', "12"],
+    ["6", "Última", "12"],
+]
+
+
+def _csv(filas):
+    salida = io.StringIO()
+    csv.writer(salida, lineterminator="\n").writerows(filas)
+    return salida.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def valoracion_falsa(monkeypatch):
+    # Una valoración por texto que permite comprobar que cada fila recibe la de su propio texto
+    monkeypatch.setattr(
+        valoracion_stream,
+        "valorar_reseñas",
+        lambda textos: [{"estrellas": len(t) % 6, "valoracion": t[:3]} for t in textos],
+    )
+
+
+def _comprobar(salida):
+    filas = list(csv.reader(io.StringIO(salida)))
+    assert filas[0][:3] == FILAS[0]
+    assert [f[:3] for f in filas[1:]] == FILAS[1:]
+    columnas = filas[0]
+    for fila, original in zip(filas[1:], FILAS[1:]):
+        registro = dict(zip(columnas, fila))
+        assert registro["estrellas"] == str(len(original[1]) % 6)
+        assert registro["valoracion"] == original[1][:3]
+
+
+def test_lineas_csv_con_saltos_y_comillas_escapadas():
+    lineas = io.StringIO(_csv(FILAS), newline="").readlines()
+    _comprobar("".join(valorar_lineas(lineas, "csv", tamaño_bloque=2)))
+
+
+def test_stream_csv_emite_antes_de_terminar_la_subida():
+    datos = _csv(FILAS).encode("utf-8")
+    # Corte en mitad de un campo entre comillas con salto de línea y de un carácter multibyte
+    mitad = datos.index("ñandú".encode()) + 1
+
+    async def probar():
+        primer_bloque = asyncio.Event()
+
+        async def cuerpo():
+            for i in range(0, mitad, 7):
+                yield datos[i : min(i + 7, mitad)]
+            # El resto de la subida solo llega cuando ya ha salido una fila valorada
+            await asyncio.wait_for(primer_bloque.wait(), timeout=5)
+            yield datos[mitad:]
+
+        trozos = []
+        async for trozo in valorar_stream(cuerpo(), "csv", tamaño_bloque=1):
+            trozos.append(trozo)
+            if len(trozos) == 2:
+                primer_bloque.set()
+        return "".join(trozos)
+
+    _comprobar(asyncio.run(probar()))
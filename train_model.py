@@ -3,97 +3,236 @@ Entrena un modelo de NLP para clasificar el sentimiento de reseñas Airbnb (espa
 Usa el diccionario de sentimiento para etiquetar los datos y un pipeline TF-IDF + LogisticRegression.
 Objetivo: accuracy >= 90%.
 """
-import re
+import argparse
+import json
+import sys
+import tempfile
+import time
+import numpy as np
 import pandas as pd
 import joblib
 from pathlib import Path
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import GridSearchCV, train_test_split, cross_val_score
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+from lexico import Lexico  # noqa: E402  (compartido con el backend)
+from datos_columnares import iterar_bloques, leer_tabla, ruta_preferida  # noqa: E402
+import modelo_compacto  # noqa: E402
+
 DATA_DIR = Path(__file__).parent / "data"
 MODEL_DIR = Path(__file__).parent / "model"
 MODEL_DIR.mkdir(exist_ok=True)
+DATA_PATH = DATA_DIR / "barcelona_solo_espanol.csv"
+MODEL_PATH = MODEL_DIR / "sentiment_pipeline.joblib"
+COMPACTO_DIR = MODEL_DIR / "sentiment_compacto"
+
+CLASES = ["Negativo", "Neutro", "Positivo"]
+
+# Rejilla de --tune: parámetros del TF-IDF y regularización del clasificador
+PARAM_GRID = {
+    "tfidf__max_features": [4000, 8000, 16000],
+    "tfidf__ngram_range": [(1, 1), (1, 2)],
+    "clf__C": [1.0, 2.0, 3.0, 5.0],
+}
 
 
-def cargar_datos():
-    df = pd.read_csv(DATA_DIR / "barcelona_solo_espanol.csv")
-    dicc = pd.read_csv(DATA_DIR / "diccionario_extenso.csv")
-    lexico = dict(zip(dicc["Palabra"].str.lower().str.strip(), dicc["Sentimiento"]))
-    # Frases que deshacen ambigüedades (ej. "buena mierda" = positivo, "una mierda" = negativo)
-    frase_path = DATA_DIR / "frases_sentimiento.csv"
-    frases_lexico = {}
-    if frase_path.exists():
-        frases_df = pd.read_csv(frase_path)
-        for _, row in frases_df.iterrows():
-            palabras_frase = tuple(str(row["Frase"]).lower().strip().split())
-            if len(palabras_frase) >= 2:
-                frases_lexico[palabras_frase] = int(row["Sentimiento"])
-    return df, lexico, frases_lexico
+def cargar_lexico():
+    # Diccionario + frases que deshacen ambigüedades (ej. "buena mierda" = positivo, "una mierda" = negativo)
+    return Lexico.desde_csv(DATA_DIR / "diccionario_extenso.csv", DATA_DIR / "frases_sentimiento.csv")
 
 
-def etiquetar_con_lexico(texto, lexico, frases_lexico=None):
+def cargar_datos(data_path=DATA_PATH):
     """
-    Etiqueta por suma del diccionario. Si hay frases_lexico, primero aplica
-    las frases (2 o 3 palabras) y no suma las palabras que forman parte de una
-    frase coincidente. Así "buena mierda" → positivo y "una mierda" / "es una mierda" → negativo.
+    Solo la columna comments. Si junto al CSV hay un .parquet al día (scripts/convertir_a_parquet.py)
+    se lee ese: sin parsear el resto de columnas y con el texto en cadenas Arrow.
+    """
+    data_path = ruta_preferida(data_path)
+    print(f"  Corpus: {data_path}")
+    return leer_tabla(data_path, columnas=["comments"]), cargar_lexico()
+
+
+def cargar_desde_almacen(almacen_path, data_path=DATA_PATH, n_jobs=1):
     """
-    palabras = re.findall(r"\b\w+\b", str(texto).lower())
-    if not palabras:
-        return "Neutro"
-    used = set()
-    score = 0
-    if frases_lexico:
-        # Primero trigramas, luego bigramas (prioridad a frases más largas)
-        for n in (3, 2):
-            for i in range(len(palabras) - n + 1):
-                if any(i + k in used for k in range(n)):
-                    continue
-                ngram = tuple(palabras[i : i + n])
-                if ngram in frases_lexico:
-                    score += frases_lexico[ngram]
-                    for k in range(n):
-                        used.add(i + k)
-    for i, p in enumerate(palabras):
-        if i not in used:
-            score += lexico.get(p, 0)
-    if score > 0:
-        return "Positivo"
-    if score < 0:
-        return "Negativo"
-    return "Neutro"
-
-
-def main():
-    print("Cargando datos...")
-    df, lexico, frases_lexico = cargar_datos()
-    df = df.dropna(subset=["comments"])
+    Reseñas y etiquetas de léxico del almacén SQLite: importa solo lo añadido al corpus desde la
+    última vez y reetiqueta solo las filas de una versión anterior del léxico. Con n_jobs != 1
+    la valoración de lo importado se reparte entre procesos que comparten el modelo.
+    """
+    from almacen_resenas import AlmacenResenas
+    from sentiment_engine import cerrar_pool, iniciar_pool
+
+    almacen = AlmacenResenas(almacen_path)
+    iniciar_pool(n_jobs)
+    try:
+        nuevas = almacen.sincronizar(ruta_preferida(data_path))
+    finally:
+        cerrar_pool()
+    print(f"  {nuevas} reseñas nuevas importadas de {data_path}")
+    df = almacen.textos_etiquetados()
     df["comments"] = df["comments"].astype(str).str.strip()
-    df = df[df["comments"].str.len() > 0]
-    if frases_lexico:
-        print(f"  Léxico de frases: {len(frases_lexico)} frases (ej. 'buena mierda' → positivo)")
+    return df
 
-    print("Generando etiquetas con el diccionario y frases...")
-    df["sentimiento"] = df["comments"].apply(lambda t: etiquetar_con_lexico(t, lexico, frases_lexico))
 
-    X = df["comments"]
-    y = df["sentimiento"]
+def etiquetar_con_lexico(texto, lexico):
+    """
+    Etiqueta por suma del diccionario con prioridad a las frases (ver lexico.Lexico): en cada
+    posición se aplica la frase más larga que empiece ahí y no se suman sus palabras sueltas.
+    Así "buena mierda" → positivo y "una mierda" / "es una puta mierda" → negativo.
+    """
+    return lexico.etiquetar(texto)
 
-    # Eliminar clases con muy pocas muestras para estratificar
-    counts = y.value_counts()
-    min_samples = 5
-    valid_labels = counts[counts >= min_samples].index.tolist()
-    mask = y.isin(valid_labels)
-    X, y = X[mask], y[mask]
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
+def leer_comentarios_por_bloques(data_path, chunksize):
+    """Lee solo la columna comments del CSV o Parquet en bloques, sin cargar el archivo entero."""
+    for chunk in iterar_bloques(ruta_preferida(data_path), ["comments"], chunksize):
+        comentarios = chunk["comments"].dropna().astype(str).str.strip()
+        yield comentarios[comentarios.str.len() > 0]
+
+
+def es_test(comentarios, test_size=0.2):
+    """Partición train/test estable entre pasadas: se decide por el hash del texto."""
+    h = pd.util.hash_pandas_object(comentarios, index=False).to_numpy()
+    return (h % 1000) < int(test_size * 1000)
+
+
+def mostrar_informe(y_test, y_pred, clases):
+    print("\nClassification report (test):")
+    print(classification_report(y_test, y_pred))
+    print("Confusion matrix (test):")
+    print(confusion_matrix(y_test, y_pred, labels=clases))
+
+
+def comprimir_modelo(pipeline, X_test, y_test, umbral=None, cuantizacion=None, muestra=500):
+    """
+    Poda (columnas con |coeficiente| < umbral) y/o cuantiza el modelo y compara con el original:
+    columnas, accuracy en test, tamaño del artefacto compacto y del joblib y µs por reseña.
+    Devuelve el pipeline comprimido (si no es exportable, el original sin cambios).
+    """
+    if not modelo_compacto.es_exportable(pipeline):
+        print("\nEste modelo no se puede comprimir (necesita vocabulario TF-IDF y clasificador lineal)")
+        return pipeline
+    comprimido = modelo_compacto.comprimir(pipeline, umbral or 0.0, cuantizacion)
+    textos = list(X_test[:muestra])
+    filas = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for nombre, modelo, q in (("original", pipeline, None), ("comprimido", comprimido, cuantizacion)):
+            destino = modelo_compacto.exportar(modelo, Path(tmp) / nombre, cuantizacion=q)
+            joblib.dump(modelo, Path(tmp) / f"{nombre}.joblib")
+            predictor = modelo_compacto.PredictorCompacto.cargar(destino)
+            predictor.indice  # construido fuera de la medición, como hace el backend al cargar
+            inicio = time.perf_counter()
+            for texto in textos:
+                predictor.predict_proba([texto])
+            filas[nombre] = {
+                "columnas": len(predictor.vocabulario),
+                "accuracy": accuracy_score(y_test, modelo.predict(X_test)),
+                "artefacto_kb": modelo_compacto.tamaño_artefacto(destino) / 1024,
+                "joblib_kb": (Path(tmp) / f"{nombre}.joblib").stat().st_size / 1024,
+                "us_por_reseña": (time.perf_counter() - inicio) / max(len(textos), 1) * 1e6,
+            }
+    original, nuevo = filas["original"], filas["comprimido"]
+    print(f"\nCompresión del modelo (poda |coef| < {umbral or 0}, cuantización {cuantizacion or 'ninguna'}):")
+    print(f"  {'':22}{'original':>12}{'comprimido':>12}")
+    print(f"  {'columnas':22}{original['columnas']:>12}{nuevo['columnas']:>12}")
+    print(f"  {'accuracy test':22}{original['accuracy']:>12.4f}{nuevo['accuracy']:>12.4f}"
+          f"   ({(nuevo['accuracy'] - original['accuracy']) * 100:+.2f} pp)")
+    print(f"  {'artefacto compacto KB':22}{original['artefacto_kb']:>12.0f}{nuevo['artefacto_kb']:>12.0f}")
+    print(f"  {'joblib KB':22}{original['joblib_kb']:>12.0f}{nuevo['joblib_kb']:>12.0f}")
+    print(f"  {'µs por reseña':22}{original['us_por_reseña']:>12.1f}{nuevo['us_por_reseña']:>12.1f}")
+    return comprimido
+
+
+def guardar_modelo(pipeline, modelo_dir=MODEL_DIR, cuantizacion=None):
+    modelo_dir = Path(modelo_dir)
+    modelo_dir.mkdir(parents=True, exist_ok=True)
+    model_path = modelo_dir / MODEL_PATH.name
+    compacto_dir = modelo_dir / COMPACTO_DIR.name
+    joblib.dump(pipeline, model_path)
+    print(f"\nModelo guardado en {model_path}")
+    if modelo_compacto.es_exportable(pipeline):
+        destino = modelo_compacto.exportar(pipeline, compacto_dir, origen=model_path, cuantizacion=cuantizacion)
+        try:
+            diferencia = modelo_compacto.comprobar_equivalencia(pipeline, modelo_compacto.PredictorCompacto.cargar(destino))
+        except ValueError as e:
+            # Sin meta.json el backend no lo considera actualizado y usa el joblib
+            (destino / "meta.json").unlink()
+            print(f"Artefacto compacto descartado: {e}")
+        else:
+            print(f"Artefacto compacto para inferencia guardado en {destino} (diferencia con predict_proba: {diferencia:.2g})")
+    elif compacto_dir.exists():
+        # El artefacto anterior ya no corresponde al joblib: el backend lo ignora por su huella
+        print("Este modelo no tiene formato compacto; el backend usará el joblib")
+
+
+def entrenar_streaming(args, lexico):
+    """
+    Entrenamiento out-of-core para corpus que no caben en memoria. El CSV se lee en bloques:
+    1ª pasada: etiqueta, cuenta clases y frecuencias documentales de los n-gramas (hashing),
+    para fijar los pesos balanceados y el IDF; después `epocas` pasadas con partial_fit de un
+    clasificador lineal logístico y una pasada final para evaluar sobre la partición de test.
+    """
+    hashing = HashingVectorizer(
+        n_features=args.n_features, ngram_range=(1, 2), alternate_sign=False, norm=None
     )
+    print(f"Pipeline (streaming): Hashing ({args.n_features} columnas) + TF-IDF + SGD logístico")
+    print(f"1ª pasada: etiquetas y frecuencias documentales (bloques de {args.chunksize} filas)...")
+    n_train = 0
+    conteo_clases = pd.Series(0, index=CLASES)
+    frecuencia_doc = np.zeros(args.n_features, dtype=np.int64)
+    for comentarios in leer_comentarios_por_bloques(args.datos, args.chunksize):
+        train = comentarios[~es_test(comentarios)]
+        if train.empty:
+            continue
+        etiquetas = lexico.etiquetar_many(train, n_jobs=args.n_jobs)
+        conteo_clases = conteo_clases.add(pd.Series(etiquetas).value_counts(), fill_value=0)
+        frecuencia_doc += np.bincount(hashing.transform(train).indices, minlength=args.n_features)
+        n_train += len(train)
+    if n_train == 0:
+        print("No hay reseñas para entrenar")
+        return
+    print(f"  {n_train} reseñas de entrenamiento: {conteo_clases.astype(int).to_dict()}")
 
-    print("\nPipeline: TF-IDF + LogisticRegression")
-    pipeline = Pipeline(
+    tfidf = TfidfTransformer(sublinear_tf=True)
+    tfidf.idf_ = np.log((1 + n_train) / (1 + frecuencia_doc)) + 1
+    pesos_clase = (n_train / (len(CLASES) * conteo_clases.clip(lower=1))).to_dict()
+    clf = SGDClassifier(loss="log_loss", alpha=args.alpha, random_state=42)
+    rng = np.random.default_rng(42)
+
+    for epoca in range(1, args.epocas + 1):
+        print(f"Época {epoca}/{args.epocas}...")
+        for comentarios in leer_comentarios_por_bloques(args.datos, args.chunksize):
+            train = comentarios[~es_test(comentarios)]
+            if train.empty:
+                continue
+            train = train.iloc[rng.permutation(len(train))]
+            etiquetas = lexico.etiquetar_many(train, n_jobs=args.n_jobs)
+            X = tfidf.transform(hashing.transform(train))
+            pesos = np.array([pesos_clase[e] for e in etiquetas])
+            clf.partial_fit(X, etiquetas, classes=CLASES, sample_weight=pesos)
+
+    pipeline = Pipeline([("hashing", hashing), ("tfidf", tfidf), ("clf", clf)])
+    y_test, y_pred = [], []
+    for comentarios in leer_comentarios_por_bloques(args.datos, args.chunksize):
+        test = comentarios[es_test(comentarios)]
+        if test.empty:
+            continue
+        y_test.extend(lexico.etiquetar_many(test, n_jobs=args.n_jobs))
+        y_pred.extend(pipeline.predict(test))
+    if y_test:
+        acc = accuracy_score(y_test, y_pred)
+        print(f"\nAccuracy en test: {acc:.4f} ({acc*100:.2f}%)")
+        print("(En modo streaming no se hace validación cruzada: cada fold sería otra pasada completa.)")
+        mostrar_informe(y_test, y_pred, pipeline.classes_)
+    if args.podar is not None or args.cuantizar:
+        print("--podar/--cuantizar no se aplican en modo streaming (HashingVectorizer no tiene vocabulario)")
+    guardar_modelo(pipeline, args.modelo_dir)
+
+
+def construir_pipeline(memory=None):
+    return Pipeline(
         [
             (
                 "tfidf",
@@ -115,9 +254,15 @@ def main():
                     random_state=42,
                 ),
             ),
-        ]
+        ],
+        memory=memory,
     )
 
+
+def entrenar_con_ajuste(X, y, X_train, y_train, X_test, y_test, memoria):
+    print("\nPipeline: TF-IDF + LogisticRegression")
+    pipeline = construir_pipeline(memory=memoria)
+
     print("Entrenando...")
     pipeline.fit(X_train, y_train)
 
@@ -129,7 +274,7 @@ def main():
         print("Probando validación cruzada para ajuste...")
         scores = cross_val_score(pipeline, X, y, cv=5, scoring="accuracy")
         print(f"CV accuracy: {scores.mean():.4f} (+/- {scores.std()*2:.4f})")
-        # Probar con más features o otro C
+        # Probar con otro C (el TF-IDF de X_train sale de la caché); búsqueda completa: --tune
         for C in [1.0, 3.0, 5.0]:
             pipeline.set_params(clf__C=C)
             pipeline.fit(X_train, y_train)
@@ -140,18 +285,152 @@ def main():
         pipeline.set_params(clf__C=2.0)
         pipeline.fit(X_train, y_train)
         y_pred = pipeline.predict(X_test)
-        acc = accuracy_score(y_test, y_pred)
     else:
         scores = cross_val_score(pipeline, X, y, cv=5, scoring="accuracy")
         print(f"Validación cruzada (5-fold): {scores.mean():.4f} (+/- {scores.std()*2:.4f})")
+    return pipeline, y_pred
 
-    print("\nClassification report (test):")
-    print(classification_report(y_test, y_pred))
-    print("Confusion matrix (test):")
-    print(confusion_matrix(y_test, y_pred, labels=pipeline.classes_))
 
-    joblib.dump(pipeline, MODEL_DIR / "sentiment_pipeline.joblib")
-    print(f"\nModelo guardado en {MODEL_DIR / 'sentiment_pipeline.joblib'}")
+def buscar_hiperparametros(X_train, y_train, memoria, args):
+    """
+    Búsqueda en rejilla (5-fold sobre train) de los parámetros del TF-IDF y de C, en paralelo
+    con n_jobs. Con la caché del Pipeline, cada combinación de TF-IDF se ajusta una vez por fold
+    y se reutiliza para todos los C. Guarda la mejor configuración y la tabla de tiempos.
+    """
+    n_combinaciones = int(np.prod([len(v) for v in PARAM_GRID.values()]))
+    print(f"\nBúsqueda de hiperparámetros: {n_combinaciones} combinaciones x 5 folds (n_jobs={args.n_jobs})")
+    busqueda = GridSearchCV(
+        construir_pipeline(memory=memoria),
+        PARAM_GRID,
+        cv=5,
+        scoring="accuracy",
+        n_jobs=args.n_jobs,
+    )
+    inicio = time.perf_counter()
+    busqueda.fit(X_train, y_train)
+    duracion = time.perf_counter() - inicio
+
+    tabla = pd.DataFrame(busqueda.cv_results_)[
+        ["params", "mean_fit_time", "mean_score_time", "mean_test_score", "std_test_score", "rank_test_score"]
+    ].sort_values("rank_test_score")
+    tabla["params"] = tabla["params"].astype(str)
+    args.modelo_dir.mkdir(parents=True, exist_ok=True)
+    tabla.to_csv(args.modelo_dir / "tuning_resultados.csv", index=False)
+    resumen = {
+        "mejores_parametros": {k: list(v) if isinstance(v, tuple) else v for k, v in busqueda.best_params_.items()},
+        "cv_accuracy": round(float(busqueda.best_score_), 4),
+        "duracion_segundos": round(duracion, 2),
+        "n_jobs": args.n_jobs,
+    }
+    with open(args.modelo_dir / "tuning_resultados.json", "w", encoding="utf-8") as f:
+        json.dump(resumen, f, ensure_ascii=False, indent=2)
+
+    print(tabla.head(10).to_string(index=False))
+    print(f"Mejor configuración: {resumen['mejores_parametros']} (CV {busqueda.best_score_:.4f}, {duracion:.1f}s)")
+    print(f"Resultados guardados en {args.modelo_dir / 'tuning_resultados.json'} y tuning_resultados.csv")
+    return busqueda.best_estimator_
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Entrena el modelo de sentimiento de reseñas Airbnb.")
+    parser.add_argument("--datos", type=Path, default=DATA_PATH, help="CSV o Parquet de reseñas (columna comments).")
+    parser.add_argument(
+        "--modelo-dir", type=Path, default=MODEL_DIR,
+        help="Carpeta donde se guardan el modelo, el artefacto compacto y los resultados de --tune.",
+    )
+    parser.add_argument(
+        "--n-jobs", type=int, default=1,
+        help="Procesos para etiquetar o valorar el corpus en bloque y para --tune (-1 = todos los núcleos).",
+    )
+    parser.add_argument(
+        "--almacen", type=Path, nargs="?", const=DATA_DIR / "resenas.sqlite", default=None,
+        help="Entrena desde el almacén SQLite de reseñas (etiquetas ya calculadas; solo se procesa lo nuevo).",
+    )
+    tuning = parser.add_argument_group("búsqueda de hiperparámetros")
+    tuning.add_argument(
+        "--tune", action="store_true",
+        help="Búsqueda en rejilla en paralelo (usa --n-jobs) y guarda la mejor configuración.",
+    )
+    tuning.add_argument(
+        "--cache-dir", type=Path, default=None,
+        help="Directorio persistente para la caché de TF-IDF ajustados (por defecto, temporal).",
+    )
+    compresion = parser.add_argument_group("compresión del modelo exportado")
+    compresion.add_argument(
+        "--podar", type=float, default=None, metavar="UMBRAL",
+        help="Elimina los términos cuyo mayor |coeficiente| entre clases es menor que UMBRAL (p. ej. 0.1).",
+    )
+    compresion.add_argument(
+        "--cuantizar", choices=modelo_compacto.CUANTIZACIONES, default=None,
+        help="Guarda los coeficientes en float16 o int8 (escala por clase).",
+    )
+    streaming = parser.add_argument_group("modo streaming (corpus que no caben en memoria)")
+    streaming.add_argument("--streaming", action="store_true", help="Entrena leyendo el CSV por bloques.")
+    streaming.add_argument("--chunksize", type=int, default=50000, help="Filas por bloque.")
+    streaming.add_argument("--epocas", type=int, default=5, help="Pasadas de partial_fit sobre el corpus.")
+    streaming.add_argument("--n-features", type=int, default=2**20, help="Columnas del HashingVectorizer.")
+    streaming.add_argument("--alpha", type=float, default=1e-5, help="Regularización del SGDClassifier.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.streaming:
+        print("Cargando léxico...")
+        lexico = cargar_lexico()
+        try:
+            return entrenar_streaming(args, lexico)
+        finally:
+            lexico.cerrar_pool()
+
+    if args.almacen:
+        print(f"Cargando reseñas etiquetadas del almacén {args.almacen}...")
+        df = cargar_desde_almacen(args.almacen, args.datos, args.n_jobs)
+    else:
+        print("Cargando datos...")
+        df, lexico = cargar_datos(args.datos)
+        df = df.dropna(subset=["comments"])
+        df["comments"] = df["comments"].astype(str).str.strip()
+        df = df[df["comments"].str.len() > 0]
+        if lexico.frases:
+            print(f"  Léxico de frases: {len(lexico.frases)} frases (ej. 'buena mierda' → positivo)")
+
+        print("Generando etiquetas con el diccionario y frases...")
+        df["sentimiento"] = lexico.etiquetar_many(df["comments"], n_jobs=args.n_jobs)
+        lexico.cerrar_pool()
+
+    X = df["comments"]
+    y = df["sentimiento"]
+
+    # Eliminar clases con muy pocas muestras para estratificar
+    counts = y.value_counts()
+    min_samples = 5
+    valid_labels = counts[counts >= min_samples].index.tolist()
+    mask = y.isin(valid_labels)
+    X, y = X[mask], y[mask]
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42, stratify=y
+    )
+
+    # Caché de transformadores ajustados: reajustar solo el clasificador (otro C, otro fold ya
+    # visto) reutiliza la matriz TF-IDF en lugar de volver a tokenizar y vectorizar.
+    with tempfile.TemporaryDirectory() as tmp:
+        memoria = joblib.Memory(args.cache_dir or tmp, verbose=0)
+        if args.tune:
+            pipeline = buscar_hiperparametros(X_train, y_train, memoria, args)
+            y_pred = pipeline.predict(X_test)
+            acc = accuracy_score(y_test, y_pred)
+            print(f"\nAccuracy en test (mejor configuración): {acc:.4f} ({acc*100:.2f}%)")
+        else:
+            pipeline, y_pred = entrenar_con_ajuste(X, y, X_train, y_train, X_test, y_test, memoria)
+        pipeline.set_params(memory=None)
+
+    mostrar_informe(y_test, y_pred, pipeline.classes_)
+    if args.podar is not None or args.cuantizar:
+        pipeline = comprimir_modelo(pipeline, X_test, y_test, args.podar, args.cuantizar)
+    guardar_modelo(pipeline, args.modelo_dir, args.cuantizar)
+
 
 if __name__ == "__main__":
     main()
@@ -5,8 +5,12 @@ import {
   valorarResena,
   fetchResenas,
   healthCheck,
+  fetchRankingListings,
+  fetchSentimientoListing,
   type ValorarResponse,
   type ResenaItem,
+  type ListingSentimiento,
+  type ListingSentimientoDetalle,
 } from "@/lib/api";
 
 function StarsDisplay({ estrellas }: { estrellas: number }) {
@@ -82,6 +86,10 @@ export default function Home() {
   const [certify, setCertify] = useState(false);
   const [pagina, setPagina] = useState(1);
   const porPagina = 12;
+  const [ranking, setRanking] = useState<ListingSentimiento[]>([]);
+  const [ordenRanking, setOrdenRanking] = useState<"desc" | "asc">("desc");
+  const [listing, setListing] = useState<ListingSentimientoDetalle | null>(null);
+  const [listingCargando, setListingCargando] = useState(false);
 
   const promedio =
     resenas.length > 0
@@ -90,9 +98,23 @@ export default function Home() {
   const promedioStr = promedio > 0 ? promedio.toFixed(2) : "—";
 
   useEffect(() => {
-    healthCheck()
-      .then((r) => setApiOk(r.ok && r.modelo_cargado))
-      .catch(() => setApiOk(false));
+    let cancelado = false;
+    const comprobar = () =>
+      healthCheck()
+        .then((r) => {
+          if (cancelado) return;
+          // Mientras el backend precalienta el modelo, volver a preguntar
+          if (r.ok && r.listo === false) {
+            setTimeout(comprobar, 1000);
+            return;
+          }
+          setApiOk(r.ok && r.modelo_cargado);
+        })
+        .catch(() => !cancelado && setApiOk(false));
+    comprobar();
+    return () => {
+      cancelado = true;
+    };
   }, []);
 
   useEffect(() => {
@@ -105,6 +127,25 @@ export default function Home() {
     }
   }, [apiOk]);
 
+  useEffect(() => {
+    if (apiOk) {
+      fetchRankingListings(8, ordenRanking, 5)
+        .then(setRanking)
+        .catch(() => setRanking([]));
+    }
+  }, [apiOk, ordenRanking]);
+
+  async function abrirListing(listingId: string) {
+    setListingCargando(true);
+    try {
+      setListing(await fetchSentimientoListing(listingId));
+    } catch {
+      setListing(null);
+    } finally {
+      setListingCargando(false);
+    }
+  }
+
   let resenasFiltradas = filtro === "Todas" ? resenas : resenas.filter((r) => r.valoracion === filtro);
   if (busqueda.trim()) {
     const q = busqueda.toLowerCase();
@@ -332,6 +373,77 @@ export default function Home() {
           )}
         </div>
 
+        {/* Alojamientos según el sentimiento de sus reseñas (rollups del backend) */}
+        {ranking.length > 0 && (
+          <div className="mb-12 grid grid-cols-1 lg:grid-cols-2 gap-8">
+            <div>
+              <div className="flex items-center justify-between mb-4">
+                <h3 className="text-xl font-semibold text-[#222222]">Alojamientos según sus reseñas</h3>
+                <select
+                  value={ordenRanking}
+                  onChange={(e) => setOrdenRanking(e.target.value as "desc" | "asc")}
+                  className="appearance-none bg-white border border-[#dddddd] text-[#222222] py-2 pl-3 pr-8 rounded-full text-sm font-medium focus:outline-none focus:border-[#222222] cursor-pointer"
+                >
+                  <option value="desc">Mejor valorados</option>
+                  <option value="asc">Peor valorados</option>
+                </select>
+              </div>
+              <ul className="divide-y divide-[#ebebeb] border border-[#dddddd] rounded-2xl overflow-hidden">
+                {ranking.map((l) => (
+                  <li key={l.listing_id}>
+                    <button
+                      type="button"
+                      onClick={() => abrirListing(l.listing_id)}
+                      className={`w-full flex items-center justify-between px-4 py-3 text-left hover:bg-[#f7f7f7] transition-colors ${listing?.listing_id === l.listing_id ? "bg-[#f7f7f7]" : ""}`}
+                    >
+                      <span className="text-sm font-medium text-[#222222]">Alojamiento {l.listing_id}</span>
+                      <span className="flex items-center gap-2 text-sm text-[#717171]">
+                        <StarsDisplay estrellas={Math.round(l.puntuacion_media ?? 0)} />
+                        {l.puntuacion_media?.toFixed(2) ?? "—"}/5 · {l.resenas} reseñas
+                      </span>
+                    </button>
+                  </li>
+                ))}
+              </ul>
+            </div>
+            <div className="p-6 bg-[#f7f7f7] border border-[#dddddd] rounded-2xl">
+              {listingCargando ? (
+                <p className="text-sm text-[#717171]">Cargando alojamiento…</p>
+              ) : listing ? (
+                <>
+                  <h3 className="text-lg font-semibold text-[#222222]">Alojamiento {listing.listing_id}</h3>
+                  <p className="text-sm text-[#717171] mb-4">
+                    {listing.puntuacion_media?.toFixed(2) ?? "—"}/5 de media en {listing.resenas} reseñas ·{" "}
+                    {listing.valoraciones.Positivo} positivas · {listing.valoraciones.Neutro} neutras ·{" "}
+                    {listing.valoraciones.Negativo} negativas
+                  </p>
+                  <div className="text-sm font-medium text-[#222222] mb-2">Tendencia mensual</div>
+                  <div className="space-y-1.5 max-h-64 overflow-y-auto pr-1">
+                    {listing.tendencia_mensual.map((m) => (
+                      <div key={m.mes} className="flex items-center gap-3">
+                        <span className="w-16 shrink-0 text-xs text-[#717171]">{m.mes || "Sin fecha"}</span>
+                        <div className="h-1 flex-1 bg-[#dddddd] rounded-full overflow-hidden">
+                          <div
+                            className="h-full bg-[#222222] rounded-full"
+                            style={{ width: `${((m.puntuacion_media ?? 0) / 5) * 100}%` }}
+                          />
+                        </div>
+                        <span className="w-24 shrink-0 text-xs text-[#222222] text-right">
+                          {m.puntuacion_media?.toFixed(2) ?? "—"} · {m.resenas} res.
+                        </span>
+                      </div>
+                    ))}
+                  </div>
+                </>
+              ) : (
+                <p className="text-sm text-[#717171]">
+                  Elige un alojamiento para ver su valoración media y cómo ha evolucionado mes a mes.
+                </p>
+              )}
+            </div>
+          </div>
+        )}
+
         {error && (
           <div className="mb-6 p-4 bg-red-50 border border-red-200 rounded-xl text-red-700 text-sm">
             {error}
@@ -9,6 +9,7 @@ export interface ValorarResponse {
 
 export interface ResenaItem {
   id: string;
+  listing_id: string;
   comments: string;
   reviewer_name: string;
   date: string;
@@ -18,6 +19,21 @@ export interface ResenaItem {
   estrellas_emoji: string;
 }
 
+export interface ResumenSentimiento {
+  resenas: number;
+  puntuacion_media: number | null;
+  valoraciones: Record<"Positivo" | "Neutro" | "Negativo", number>;
+}
+
+export interface ListingSentimiento extends ResumenSentimiento {
+  listing_id: string;
+  distribucion_estrellas: Record<string, number>;
+}
+
+export interface ListingSentimientoDetalle extends ListingSentimiento {
+  tendencia_mensual: (ResumenSentimiento & { mes: string })[];
+}
+
 export async function valorarResena(texto: string): Promise<ValorarResponse> {
   const res = await fetch(`${API_URL}/api/valorar`, {
     method: "POST",
@@ -38,7 +54,31 @@ export async function fetchResenas(limite = 200): Promise<ResenaItem[]> {
   return data.resenas ?? [];
 }
 
-export async function healthCheck(): Promise<{ ok: boolean; modelo_cargado: boolean }> {
+export async function fetchSentimientoListing(listingId: string): Promise<ListingSentimientoDetalle> {
+  const res = await fetch(`${API_URL}/api/listings/${encodeURIComponent(listingId)}/sentimiento`);
+  if (!res.ok) throw new Error("Error al cargar el sentimiento del listing");
+  return res.json();
+}
+
+export async function fetchRankingListings(
+  limite = 50,
+  orden: "asc" | "desc" = "desc",
+  minResenas = 1
+): Promise<ListingSentimiento[]> {
+  const res = await fetch(
+    `${API_URL}/api/listings/ranking?limite=${limite}&orden=${orden}&min_resenas=${minResenas}`
+  );
+  if (!res.ok) throw new Error("Error al cargar el ranking de listings");
+  const data = await res.json();
+  return data.listings ?? [];
+}
+
+export async function healthCheck(): Promise<{
+  ok: boolean;
+  vivo: boolean;
+  listo: boolean;
+  modelo_cargado: boolean;
+}> {
   const res = await fetch(`${API_URL}/api/health`);
   if (!res.ok) throw new Error("API no disponible");
   return res.json();